@@ -0,0 +1,115 @@
+import constants
+
+# Lookup tables indexed by square index (0 = a1, 63 = h8), built once at import.
+
+ROOK_DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+KNIGHT_STEPS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+KING_STEPS = ROOK_DIRECTIONS + BISHOP_DIRECTIONS
+PAWN_CAPTURE_STEPS = {
+    constants.WHITE: ((1, -1), (1, 1)),
+    constants.BLACK: ((-1, -1), (-1, 1)),
+}
+
+
+def _ray(index, row_step, col_step):
+    # Squares from index (excluded) in one direction up to the edge of the board, as list of indices
+    row, col = divmod(index, constants.BOARD_SIZE)
+    squares = []
+    row += row_step
+    col += col_step
+    while 0 <= row < constants.BOARD_SIZE and 0 <= col < constants.BOARD_SIZE:
+        squares.append(row * constants.BOARD_SIZE + col)
+        row += row_step
+        col += col_step
+    return squares
+
+
+def _build_line_tables():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for index in range(64):
+        for row_step, col_step in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            full_line = (1 << index)
+            for square in _ray(index, row_step, col_step) + _ray(index, -row_step, -col_step):
+                full_line |= 1 << square
+            squares_between = 0
+            for square in _ray(index, row_step, col_step):
+                between[index][square] = squares_between
+                line[index][square] = full_line
+                squares_between |= 1 << square
+    return between, line
+
+
+def _build_step_attacks(steps):
+    # Attacks of a piece that moves by single steps (knight, king, capturing pawn)
+    attacks = [0] * 64
+    for index in range(64):
+        row, col = divmod(index, constants.BOARD_SIZE)
+        for row_step, col_step in steps:
+            if 0 <= row + row_step < constants.BOARD_SIZE and 0 <= col + col_step < constants.BOARD_SIZE:
+                attacks[index] |= 1 << ((row + row_step) * constants.BOARD_SIZE + col + col_step)
+    return attacks
+
+
+def _build_empty_board_attacks(directions):
+    attacks = [0] * 64
+    for index in range(64):
+        for row_step, col_step in directions:
+            for square in _ray(index, row_step, col_step):
+                attacks[index] |= 1 << square
+    return attacks
+
+
+def _build_sliding_attacks(directions):
+    # For every square the relevant occupancy mask and a table from each occupancy of the mask to the attacked squares.
+    # The last square of a ray is not part of the mask, a piece there can not block anything behind it. The masked
+    # occupancy is a perfect key: every subset of the mask has its own entry, so the lookup needs no verification.
+    masks = [0] * 64
+    tables = [None] * 64
+    for index in range(64):
+        rays = [[1 << square for square in _ray(index, row_step, col_step)] for row_step, col_step in directions]
+        mask = 0
+        for ray in rays:
+            for square in ray[:-1]:
+                mask |= square
+        table = {}
+        occupancy = 0
+        while True:
+            attacks = 0
+            for ray in rays:
+                for square in ray:
+                    attacks |= square
+                    if occupancy & square:
+                        break
+            table[occupancy] = attacks
+            # Next subset of the mask (carry-rippler)
+            occupancy = (occupancy - mask) & mask
+            if not occupancy:
+                break
+        masks[index] = mask
+        tables[index] = table
+    return masks, tables
+
+
+# BETWEEN[a][b]: squares strictly between a and b if they share a rank, file or diagonal, else 0
+# LINE[a][b]: the whole rank, file or diagonal through a and b, else 0
+BETWEEN, LINE = _build_line_tables()
+
+# DISTANCE[a][b]: number of king moves between two squares
+DISTANCE = [[max(abs(a // 8 - b // 8), abs(a % 8 - b % 8)) for b in range(64)] for a in range(64)]
+
+# Attacks of a rook/bishop on an empty board
+ROOK_RAYS = _build_empty_board_attacks(ROOK_DIRECTIONS)
+BISHOP_RAYS = _build_empty_board_attacks(BISHOP_DIRECTIONS)
+
+KNIGHT_ATTACKS = _build_step_attacks(KNIGHT_STEPS)
+KING_ATTACKS = _build_step_attacks(KING_STEPS)
+# PAWN_ATTACKS[color][index]: squares a pawn of that colour on the square attacks. The pawns of a colour that attack a
+# square are therefore found with the table of the other colour.
+PAWN_ATTACKS = [_build_step_attacks(PAWN_CAPTURE_STEPS[color]) for color in (constants.WHITE, constants.BLACK)]
+
+# Sliding attacks including the first blocker in every direction:
+# ROOK_ATTACKS[index][occupied & ROOK_MASKS[index]], the same for bishops, queens use both
+ROOK_MASKS, ROOK_ATTACKS = _build_sliding_attacks(ROOK_DIRECTIONS)
+BISHOP_MASKS, BISHOP_ATTACKS = _build_sliding_attacks(BISHOP_DIRECTIONS)
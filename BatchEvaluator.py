@@ -0,0 +1,66 @@
+import numpy as np
+import AttackTables
+import PieceSquareTables
+import constants
+
+
+class BatchEvaluator:
+    """
+    Vectorised evaluation of many positions at once with NumPy.
+
+    The positions are given as a (8, n) uint64 array with the eight bitboards of ChessBoard (or a list of eight
+    arrays) and an array with the player to move of each position. The bitboards are unpacked into (n, 64) square
+    masks with shifts, then the material and centre terms are dot products with the piece-square tables and the king
+    distance terms with rows of a distance weight table. The check and mate terms of ChessBoard.evaluate_board()
+    need the move generator and are not part of the batch evaluation.
+    """
+
+    _SHIFTS = np.arange(64, dtype=np.uint64)
+    # PST[piece][index] in pawns, rows below PAWN are unused
+    _PST = np.array([[0.0] * 64 if table is None else table for table in PieceSquareTables.PST], dtype=np.float64) / PieceSquareTables.SCALE
+    # Weight of a piece near a king, see ChessBoard._evaluate_king_proximity()
+    _PROXIMITY_WEIGHTS = 0.2 / (np.array(AttackTables.DISTANCE, dtype=np.float64) + 1)
+
+    def __init__(self) -> None:
+        pass
+
+    @staticmethod
+    def evaluate(bitboards, players):
+        # Same as evaluate_board(with_king_safety=False) + _evaluate_king_proximity(player) for every position
+        bitboards = np.asarray(bitboards, dtype=np.uint64)
+        squares = BatchEvaluator._unpack(bitboards)
+        own, opponent = BatchEvaluator._split_by_player(squares[constants.WHITE], squares[constants.BLACK], players)
+        score = np.zeros(len(players), dtype=np.float64)
+        for piece in range(constants.PAWN, constants.KING + 1):
+            score += ((own & squares[piece]).astype(np.float64) - (opponent & squares[piece]).astype(np.float64)) @ BatchEvaluator._PST[piece]
+        return score + BatchEvaluator._king_proximity(squares[constants.KING], own, opponent)
+
+    @staticmethod
+    def king_proximity(white, black, kings, players):
+        # Same as _evaluate_king_proximity(player) for every position, only the colour and king bitboards are needed
+        squares = BatchEvaluator._unpack(np.array([white, black, kings], dtype=np.uint64))
+        own, opponent = BatchEvaluator._split_by_player(squares[0], squares[1], players)
+        return BatchEvaluator._king_proximity(squares[2], own, opponent)
+
+    @staticmethod
+    def _unpack(bitboards):
+        # squares[board][position][index]: is the bit of the square set
+        return ((bitboards[:, :, None] >> BatchEvaluator._SHIFTS) & np.uint64(1)).astype(bool)
+
+    @staticmethod
+    def _split_by_player(white, black, players):
+        is_white = (np.asarray(players) == constants.WHITE)[:, None]
+        return np.where(is_white, white, black), np.where(is_white, black, white)
+
+    @staticmethod
+    def _king_proximity(kings, own, opponent):
+        score = np.zeros(own.shape[0], dtype=np.float64)
+        # Penalty for own pieces near the enemy king, bonus for enemy pieces near the own king. With several kings
+        # the one on the highest square counts, like bit_length() in the scalar evaluation.
+        for king_owner, pieces, sign in ((opponent, own, -1.0), (own, opponent, 1.0)):
+            king_squares = kings & king_owner
+            has_king = king_squares.any(axis=1)
+            king_index = 63 - np.argmax(king_squares[:, ::-1], axis=1)
+            weights = BatchEvaluator._PROXIMITY_WEIGHTS[king_index]
+            score += np.where(has_king, sign * (pieces * weights).sum(axis=1), 0.0)
+        return score
@@ -1,231 +1,428 @@
 from ChessEngine import ChessEngine
-from ChessPrintService import ChessPrintService
+from Position import Position
+from PositionStatus import PositionStatus
+from TranspositionTable import TranspositionTable
+from SearchController import SearchController
+from MoveOrderer import MoveOrderer
+from MoveEncoding import MoveEncoding, MoveBuffers
+from SearchTimeoutException import SearchTimeoutException
+import AttackTables
+import PieceSquareTables
 import constants
-import copy
 import math
-from loguru import logger
-import time
 
 
-class ChessBoard:
+class ChessBoard(Position):
+    """
+    A game position with the evaluation and the search. The state itself and make/unmake are inherited from
+    Position; the caches of the evaluation belong to the board and are not part of a Position copy. The fields of
+    the board are slots like those of Position, so the board the search makes and unmakes its moves on has no
+    instance dictionary either.
+    """
+
+    __slots__ = ("king_safety_cache", "king_proximity_cache", "use_batch_evaluation", "tablebase", "move_buffers")
+
     def __init__(self):
-        self.bitboards = None
-        self.initialize_bitboards()
-        self.current_player = constants.WHITE
-        self.chessEngine = ChessEngine()
-        self.game_result = None
-        self.board_history = []
-        self.pawn_not_moved_counter = 0
-
-    def initialize_bitboards(self):
-        self.bitboards = [0] * 8
-
-        # Set initial positions for constants.WHITE, black and all pieces using binary literals
-        self.bitboards[constants.WHITE] = int("0b0000000000000000000000000000000000000000000000001111111111111111", 2)
-        self.bitboards[constants.BLACK] = int("0b1111111111111111000000000000000000000000000000000000000000000000", 2)
-        self.bitboards[constants.PAWN] = int("0b0000000011111111000000000000000000000000000000001111111100000000", 2)
-        self.bitboards[constants.KNIGHT] = int("0b0100001000000000000000000000000000000000000000000000000001000010", 2)
-        self.bitboards[constants.BISHOP] = int("0b0010010000000000000000000000000000000000000000000000000000100100", 2)
-        self.bitboards[constants.ROOK] = int("0b1000000100000000000000000000000000000000000000000000000010000001", 2)
-        self.bitboards[constants.QUEEN] = int("0b0000100000000000000000000000000000000000000000000000000000001000", 2)
-        self.bitboards[constants.KING] = int("0b0001000000000000000000000000000000000000000000000000000000010000", 2)
-
-    def load_from_fen(self, fen):
-        fen_parts = fen.split(" ")
-        piece_positions = fen_parts[0]
-        current_player_fen = fen_parts[1]
-
-        self.current_player = constants.WHITE if current_player_fen == "w" else constants.BLACK
-
-        rows = piece_positions.split("/")
-
-        self.bitboards = [0] * 8
-
-        piece_symbols = {
-            "P": constants.PAWN,
-            "N": constants.KNIGHT,
-            "B": constants.BISHOP,
-            "R": constants.ROOK,
-            "Q": constants.QUEEN,
-            "K": constants.KING,
-        }
-
-        # Process rows in reverse order
-        for row_index, row in enumerate(reversed(rows)):
-            col_index = 0
-            for char in row:
-                if char.isdigit():
-                    col_index += int(char)
-                else:
-                    color = constants.WHITE if char.isupper() else constants.BLACK
-                    piece_type = piece_symbols[char.upper()]
-
-                    square = 1 << (row_index * 8 + col_index)
-
-                    self.bitboards[color] |= square
-                    self.bitboards[piece_type] |= square
-
-                    col_index += 1
-        # PrintBitBoardService.print_bitboards(self.bitboards)
-        # PrintBitBoardService.print_board(self.bitboards)
-
-    def evaluate_board(self, move=None, move_type="algebraic"):
+        super().__init__()
+        # King safety scores by position key, see evaluate_king_safety()
+        self.king_safety_cache = {}
+        # King proximity terms computed in advance by the batch evaluation, by (white, black, kings, player)
+        self.king_proximity_cache = {}
+        self.use_batch_evaluation = False
+        # EndgameTablebase probed by the search, None to search endgames like any other position
+        self.tablebase = None
+        # The search generates the moves of every ply into these buffers, see PositionStatus
+        self.move_buffers = MoveBuffers(ChessBoard.MAX_SEARCH_PLY)
+
+    KING_SAFETY_CACHE_SIZE = 100000
+    # Deepest ply of negamax() and quiescence() together
+    MAX_SEARCH_PLY = 128
+
+    def evaluate_board(self, move=None, move_type="algebraic", with_king_safety=True, status=None):
         # Evaluate the board after a move or on current board
         # The evaluation method should be symmetric
         # TODO: there are a lot of hardcoded values to compute the score, need for improvement
-        board_after_move = copy.deepcopy(self)
-        if move:
-            ChessEngine.perform_move(move, board_after_move, move_type, with_validation=False)
-            
-        CENTER__MASK = int("0b0000000000000000001111000011110000111100001111000000000000000000", 2)
+        # Material, center control and the king's position near the center (the hill) are kept as running sums by
+        # make/unmake, only the king safety terms have to look at the pieces. They can be skipped with
+        # with_king_safety=False. The PositionStatus of the current position can be given if it is already known.
+        player = self.current_player
+        opponent = ChessBoard.get_opponent(player) # this is correct, since we always want to evaluate the board for the current player, before or after his move
+        if not move:
+            score = (self.pst_score[player] - self.pst_score[opponent]) / PieceSquareTables.SCALE
+            return score + self.evaluate_king_safety(status) if with_king_safety else score
+
+        king_index = (self.bitboards[player] & self.bitboards[constants.KING]).bit_length() - 1
+        ChessEngine.perform_move(move, self, move_type, with_validation=False)
+        # The king's position near the center is evaluated on the board before the move, as the other king terms
+        moved_king_index = (self.bitboards[player] & self.bitboards[constants.KING]).bit_length() - 1
+        score = (self.pst_score[player] - self.pst_score[opponent] + PieceSquareTables.HILL[king_index]
+                 - PieceSquareTables.HILL[moved_king_index]) / PieceSquareTables.SCALE
+        if with_king_safety:
+            score += self._evaluate_king_proximity(player)
+        # Check and check mate are evaluated on the board before the move
+        self.unmake_move()
+        if with_king_safety:
+            score += self._evaluate_check()
+        return score
+
+    def evaluate_king_safety(self, status=None):
+        # The expensive part of the evaluation for the current player, cached by position key
+        score = self.king_safety_cache.get(self.hash_key)
+        if score is None:
+            if len(self.king_safety_cache) >= ChessBoard.KING_SAFETY_CACHE_SIZE:
+                self.king_safety_cache.clear()
+            proximity = self.king_proximity_cache.get((self.bitboards[constants.WHITE], self.bitboards[constants.BLACK],
+                                                       self.bitboards[constants.KING], self.current_player)) if self.king_proximity_cache else None
+            if proximity is None:
+                proximity = self._evaluate_king_proximity(self.current_player)
+            score = proximity + self._evaluate_check(status)
+            self.king_safety_cache[self.hash_key] = score
+        return score
+
+    def _evaluate_leaves_in_batch(self, legal_moves):
+        # Computes the king proximity terms of all positions after legal_moves with one call of the NumPy evaluator,
+        # evaluate_king_safety() takes them from the cache. The term only depends on the colour and king bitboards,
+        # so they are derived from the move without making it.
+        from BatchEvaluator import BatchEvaluator  # NumPy is only needed for the batch evaluation
+        player = self.current_player
+        opponent = ChessBoard.get_opponent(player)
+        own_pieces = self.bitboards[player]
+        opponent_pieces = self.bitboards[opponent]
+        kings = self.bitboards[constants.KING]
+        positions = []
+        for move in legal_moves:
+            from_square, to_square = MoveEncoding.to_tuple(move)
+            child_kings = kings & ~to_square
+            if from_square & kings:
+                child_kings = (child_kings & ~from_square) | to_square
+            child_own = own_pieces ^ from_square ^ to_square
+            child_opponent = opponent_pieces & ~to_square
+            if player == constants.WHITE:
+                position = (child_own, child_opponent, child_kings, opponent)
+            else:
+                position = (child_opponent, child_own, child_kings, opponent)
+            if position not in self.king_proximity_cache:
+                positions.append(position)
+        if not positions:
+            return
+        if len(self.king_proximity_cache) + len(positions) > ChessBoard.KING_SAFETY_CACHE_SIZE:
+            self.king_proximity_cache.clear()
+        white, black, child_kings, players = zip(*positions)
+        scores = BatchEvaluator.king_proximity(white, black, child_kings, players)
+        self.king_proximity_cache.update(zip(positions, scores.tolist()))
+
+    def _evaluate_king_proximity(self, player):
+        opponent = ChessBoard.get_opponent(player)
         score = 0
-        opponent = ChessBoard.get_opponent(self.current_player) # this is correct, since we always want to evaluate the board for the current player, before or after his move
-        piece_values = {
-            constants.PAWN: 1, constants.KNIGHT: 3, constants.BISHOP: 3, constants.ROOK: 5, constants.QUEEN: 9, constants.KING: 20
-        }
-        occupied_squares = board_after_move.bitboards[constants.WHITE] | board_after_move.bitboards[constants.BLACK]
-
-        while occupied_squares:
-            square = occupied_squares & -occupied_squares
-            piece = board_after_move._get_piece_at_square(square)
-            occupied_squares &= occupied_squares - 1
-            piece_value = piece_values[piece]
-            score += piece_value if square & board_after_move.bitboards[self.current_player] else -piece_value
-            # Add bonus points for controlling the center
-            if square & CENTER__MASK:
-                row, col = board_after_move._get_row_col_from_square(square)
-                center_distance = abs(row - 3.5) + abs(col - 3.5)
-                score += 0.5 / (center_distance + 1) if square & board_after_move.bitboards[self.current_player] else - 0.5 / (center_distance + 1)
-            
-            # Penalty for pieces near the enemy king
-            if square & board_after_move.bitboards[self.current_player]:
-                enemy_king_pos = board_after_move.bitboards[opponent] & board_after_move.bitboards[constants.KING]
-                distance_to_enemy_king = board_after_move._square_distance(square, enemy_king_pos)
-                score -= 0.2 / (distance_to_enemy_king + 1)
-            # Bonus for enemy pieces near the current players king
-            if square & board_after_move.bitboards[opponent]:
-                king_pos = board_after_move.bitboards[self.current_player] & board_after_move.bitboards[constants.KING]
-                distance_to_own_king = board_after_move._square_distance(square, king_pos)
-                score += 0.2 / (distance_to_own_king + 1)
+        own_king = self.bitboards[player] & self.bitboards[constants.KING]
+        enemy_king = self.bitboards[opponent] & self.bitboards[constants.KING]
+        # Penalty for pieces near the enemy king
+        if enemy_king:
+            distances = AttackTables.DISTANCE[enemy_king.bit_length() - 1]
+            pieces = self.bitboards[player]
+            while pieces:
+                score -= 0.2 / (distances[(pieces & -pieces).bit_length() - 1] + 1)
+                pieces &= pieces - 1
+        # Bonus for enemy pieces near the current players king
+        if own_king:
+            distances = AttackTables.DISTANCE[own_king.bit_length() - 1]
+            pieces = self.bitboards[opponent]
+            while pieces:
+                score += 0.2 / (distances[(pieces & -pieces).bit_length() - 1] + 1)
+                pieces &= pieces - 1
+        return score
 
+    def _evaluate_check(self, status=None):
+        if status is None:
+            status = PositionStatus(self)
+        score = 0
         # Evaluate king's safety
-        if ChessEngine.is_in_check(self):
+        if status.in_check:
             score -= 1  # Penalty for own king in check
         else:
             score += 1  # Bonus for king's safety
-        if ChessEngine.is_check_mate(self) or ChessEngine.opponent_is_king_on_the_hill(self):
+        if status.is_check_mate or status.opponent_is_on_hill:
             score -= 100  # Penalty for own king in check mate
-        if ChessEngine.opponent_is_check_mate(self):
+        if status.opponent_is_check_mate:
             score += 100
-            
-        # Bonus for king's position near the center
-        king_position = self.bitboards[self.current_player] & self.bitboards[constants.KING]
-        row, col = self._get_row_col_from_square(king_position)
-        center_distance = abs(row - 3.5) + abs(col - 3.5)
-        score += 10 / (center_distance + 1)
-        # Penalty for opponent king's position near the center
-        opp_king_position = self.bitboards[opponent] & self.bitboards[constants.KING]
-        row, col = self._get_row_col_from_square(opp_king_position)
-        center_distance = abs(row - 3.5) + abs(col - 3.5)
-        score -= 10 / (center_distance + 1)
-        
         # TODO: evaluate pawn position and pawn type; calculate a (negative?) score for draw;
-        
         return score
-    
-    def _square_distance(self, square1, square2):
-        # Assuming square1 and square2 are bitboards with a single bit set to 1
-        row1, col1 = self._get_row_col_from_square(square1)
-        row2, col2 = self._get_row_col_from_square(square2)
-        distance = max(abs(row1 - row2), abs(col1 - col2))
-        return distance
-    
-    def _get_row_col_from_square(self, square):
-        # Assuming square is a bitboard with a single bit set to 1
-        index = square.bit_length() - 1  # Get the index of the set bit
-
-        row, col = divmod(index, 8)  # Divide index by 8 to get row and column
-
-        return row, col
-
-    
-    def _get_piece_at_square(self, square):
-        if self.bitboards[constants.PAWN] & square:
-            return constants.PAWN
-        if self.bitboards[constants.KNIGHT] & square:
-            return constants.KNIGHT
-        if self.bitboards[constants.BISHOP] & square:
-            return constants.BISHOP
-        if self.bitboards[constants.ROOK] & square:
-            return constants.ROOK
-        if self.bitboards[constants.QUEEN] & square:
-            return constants.QUEEN
-        if self.bitboards[constants.KING] & square:
-            return constants.KING
-        service = ChessPrintService()
-        logger.error("Error in method _get_piece_at_square(). No figure is on the input square: {}. \n Given the board: {}", ChessEngine.binary_field_to_algebraic(square), service.print_board(self.bitboards))
-
-    def iterative_depth_search(self, max_depth, time_limit = 12000, with_cut_off=True):
-        best_score = None
+
+    def iterative_depth_search(self, max_depth, time_limit=None, with_cut_off=True, transposition_table=None, parallel_search=None,
+                               min_depth=1, search_controller=None, batch_evaluation=False):
+        # Searches with increasing depth from min_depth until max_depth is done or time_limit (seconds) is used up.
+        # The move and the principal variation of the last completed depth are returned; the move of an interrupted
+        # depth only if its first (previously best) move was completely searched. With a ParallelSearch the root moves
+        # of every depth are searched in its worker processes. A given search_controller replaces time_limit. With
+        # batch_evaluation the leaves below each frontier node are evaluated together with NumPy.
         best_move = None
+        principal_variation = []
         counter = 0
-        start_time = time.time()
-        
-        for depth in range(1, max_depth + 1):
-            score, counter, move = self.alpha_beta_max(-math.inf, math.inf, depth, counter, with_cut_off)
-            if best_score is None or score > best_score:
-                best_score = score
-                best_move = move
-                
-            # elapsed_time = time.time() - start_time
-            # if elapsed_time >= time_limit:
-            #     break
-        return best_move, counter
-
-    def alpha_beta_max(self, alpha, beta, depth_left, counter, with_cut_off=True):
-        if depth_left == 0 or ChessEngine.is_game_over(self):
-            return self.evaluate_board(), counter + 1, None
-        moves = ChessEngine.generate_moves(self)
-        legal_moves = ChessEngine.filter_illegal_moves(self, moves)
+        if search_controller is None:
+            search_controller = SearchController(time_limit)
+        # Killers and history are kept over the depths
+        move_orderer = MoveOrderer(ChessBoard.MAX_SEARCH_PLY)
+        # The search works on this board with make/unmake, so keep the game result of the actual game
+        game_result = self.game_result
+        # The transposition table is only used by the alpha-beta search, MinMax has to visit every node
+        if with_cut_off and transposition_table is None:
+            transposition_table = TranspositionTable()
+        if not with_cut_off:
+            transposition_table = None
+        if transposition_table is not None:
+            transposition_table.new_search()
+        move_stack_size = len(self.move_stack)
+        use_batch_evaluation = self.use_batch_evaluation
+        self.use_batch_evaluation = batch_evaluation
+
+        try:
+            for depth in range(min_depth, max_depth + 1):
+                search_controller.start_iteration()
+                nodes_before = search_controller.nodes
+                try:
+                    if parallel_search is not None:
+                        score, counter, variation = parallel_search.search_depth(self, depth, principal_variation, with_cut_off, counter,
+                                                                                 search_controller, move_orderer)
+                    else:
+                        score, counter, variation = self.negamax(-math.inf, math.inf, depth, counter, with_cut_off, transposition_table, 0,
+                                                                 search_controller, move_orderer)
+                except SearchTimeoutException:
+                    # Take back the moves of the interrupted search
+                    while len(self.move_stack) > move_stack_size:
+                        self.unmake_move()
+                    counter += search_controller.nodes - nodes_before
+                    # The first root move is the best move of the last depth (tried first from the table). If it was
+                    # searched completely, a move of this depth that scored at least as well is the better choice.
+                    partial_move = search_controller.iteration_best_move
+                    if partial_move is not None and (best_move is None or search_controller.iteration_first_move == best_move):
+                        if partial_move != best_move:
+                            principal_variation = [partial_move]
+                        best_move = partial_move
+                        search_controller.best_score = search_controller.iteration_best_score
+                    break
+                if variation:
+                    best_move = variation[0]
+                    principal_variation = variation
+                search_controller.completed_depth = depth
+                search_controller.best_score = score
+        finally:
+            self.game_result = game_result
+            self.use_batch_evaluation = use_batch_evaluation
+        if best_move is None:
+            # Not even the first move could be searched in time
+            legal_moves = ChessEngine.generate_legal_moves(self)
+            best_move = legal_moves[0] if legal_moves else None
+            return best_move, counter, [best_move] if best_move is not None else []
+        # The search works with encoded moves, the callers get (from_square, to_square) tuples
+        return MoveEncoding.to_tuple(best_move), counter, [MoveEncoding.to_tuple(move) for move in principal_variation]
+
+    # Captures that can not bring the score near alpha even with this extra gain are skipped in the quiescence search
+    QUIESCENCE_DELTA_MARGIN = 2
+    # Width of the null window of the principal variation search. The scores are floats, so the window is a small
+    # epsilon instead of one unit.
+    NULL_WINDOW = 1e-6
+    # Null move pruning: depth reduction and the minimal remaining depth
+    NULL_MOVE_REDUCTION = 2
+    NULL_MOVE_MIN_DEPTH = 3
+    # No null move if the opponent's king is this close to the hill, it could walk there while we pass
+    NULL_MOVE_MIN_HILL_DISTANCE = 3
+    # Late move reductions: quiet moves from this move number on are searched one ply less (two plies from the second
+    # number on) if at least LMR_MIN_DEPTH plies are left
+    LMR_MIN_MOVE_NUMBER = 3
+    LMR_DOUBLE_REDUCTION_MOVE_NUMBER = 6
+    LMR_MIN_DEPTH = 3
+    # d4, e4, d5, e5
+    HILL_INDICES = (27, 28, 35, 36)
+
+    def negamax(self, alpha, beta, depth_left, counter, with_cut_off=True, transposition_table=None, ply=0, search_controller=None,
+                move_orderer=None):
+        # Principal variation search in negamax form, scores are from the point of view of the player to move.
+        # The first move is searched with the full window, every other move only has to be proven not to be better
+        # (null window) and is searched again with the full window if it is. Without with_cut_off all moves are
+        # searched with the full window and nothing is pruned (MinMax).
+        # Returns the score, the node counter and the principal variation (list of moves, best move first). The moves
+        # are MoveEncoding integers, generated into the move buffer of the ply.
+        if search_controller is not None:
+            search_controller.check()
+        # Game over, draws, check and the legal moves of this node are determined once
+        status = PositionStatus(self, self.move_buffers[ply])
+        if self.tablebase is not None and ply > 0 and not status.is_repetition and not status.is_fifty_moves:
+            # The exact result of an endgame, the root is searched to find the move. The tables know nothing of the
+            # moves played before, the draws by repetition and the 50 moves rule are decided by the status.
+            tablebase_score = self.tablebase.get_score(self)
+            if tablebase_score is not None:
+                return tablebase_score, counter + 1, []
+        if status.get_result(with_stalemate=False)[0] is not None:
+            return self.evaluate_board(status=status), counter + 1, []
+        if depth_left == 0:
+            score, counter = self.quiescence(alpha, beta, counter, search_controller, status, ply)
+            return score, counter, []
+        tt_move = None
+        if transposition_table is not None:
+            entry = transposition_table.probe(self.hash_key)
+            if entry is not None:
+                tt_depth, tt_score, tt_bound, tt_move = entry
+                if ply > 0 and tt_depth >= depth_left:
+                    if tt_bound == TranspositionTable.EXACT:
+                        return tt_score, counter + 1, [tt_move] if tt_move is not None else []
+                    if tt_bound == TranspositionTable.LOWER_BOUND and tt_score >= beta:
+                        return beta, counter + 1, []
+                    if tt_bound == TranspositionTable.UPPER_BOUND and tt_score <= alpha:
+                        return alpha, counter + 1, []
+        in_check = status.in_check
+        if with_cut_off and ply > 0 and not in_check and self._is_null_move_allowed(depth_left, beta, status):
+            # If passing still fails high, a real move will too (apart from zugzwang, see _is_null_move_allowed())
+            self.make_null_move()
+            score, counter, _ = self.negamax(-beta, -beta + ChessBoard.NULL_WINDOW, depth_left - 1 - ChessBoard.NULL_MOVE_REDUCTION, counter,
+                                             with_cut_off, transposition_table, ply + 1, search_controller, move_orderer)
+            self.unmake_move()
+            if -score >= beta:
+                return beta, counter + 1, []
+        original_alpha = alpha
+        if not status.legal_moves:
+            # Stalemate, check mate was found above
+            return self.evaluate_board(status=status), counter + 1, []
+        legal_moves = ChessBoard._order_moves(status.legal_moves, tt_move, move_orderer, self, ply)
+        if depth_left == 1 and self.use_batch_evaluation:
+            # All children are leaves, evaluate them together
+            self._evaluate_leaves_in_batch(legal_moves)
         best_move = None
-        for move in legal_moves:
-            board_after_move = copy.deepcopy(self)
-            ChessEngine.perform_move(move, board_after_move, move_type="binary", with_validation=False)
-            if ChessEngine.is_draw(legal_moves, board_after_move):
-                score = -board_after_move.evaluate_board()
-            else:
-                score, counter, _ = board_after_move.alpha_beta_min(alpha, beta, depth_left - 1, counter, with_cut_off)
-            
+        principal_variation = []
+        for move_number, move in enumerate(legal_moves):
+            reduction = self._get_late_move_reduction(move, move_number, depth_left, ply, in_check, with_cut_off, move_orderer)
+            self.make_move(move)
+            score, counter, variation = self._search_made_move(move_number, reduction, alpha, beta, depth_left, counter, with_cut_off,
+                                                               transposition_table, ply, search_controller, move_orderer)
+            self.unmake_move()
+            if ply == 0 and search_controller is not None:
+                search_controller.report_root_move(move, score)
+
             if score >= beta and with_cut_off:
-                return beta, counter+1, None
+                if move_orderer is not None:
+                    move_orderer.record_cut_off(self, move, depth_left, ply)
+                if transposition_table is not None:
+                    transposition_table.store(self.hash_key, depth_left, beta, TranspositionTable.LOWER_BOUND, move)
+                return beta, counter + 1, []
             if score > alpha:
                 best_move = move
                 alpha = score
-        return alpha, counter+1, best_move
+                principal_variation = [move] + variation
+        if transposition_table is not None:
+            bound = TranspositionTable.EXACT if alpha > original_alpha else TranspositionTable.UPPER_BOUND
+            transposition_table.store(self.hash_key, depth_left, alpha, bound, best_move)
+        return alpha, counter + 1, principal_variation
 
-    def alpha_beta_min(self, alpha, beta, depth_left, counter, with_cut_off=True):
-        if depth_left == 0 or ChessEngine.is_game_over(self):
-            return -self.evaluate_board(), counter + 1, None
-        moves = ChessEngine.generate_moves(self)
-        legal_moves = ChessEngine.filter_illegal_moves(self, moves)
-        best_move = None
+    def _get_late_move_reduction(self, move, move_number, depth_left, ply, in_check, with_cut_off, move_orderer):
+        # Late quiet moves are unlikely to be best. Captures, promotions, killers, king moves and moves out of check are
+        # never reduced, checks are excluded after the move in _search_made_move().
+        if (not with_cut_off or in_check or move_number < ChessBoard.LMR_MIN_MOVE_NUMBER or depth_left < ChessBoard.LMR_MIN_DEPTH
+                or move & MoveOrderer.TACTICAL or self.mailbox[move & MoveEncoding.SQUARE_MASK] >> 1 == constants.KING
+                or (move_orderer is not None and move_orderer.is_killer(move, ply))):
+            return 0
+        return 2 if move_number >= ChessBoard.LMR_DOUBLE_REDUCTION_MOVE_NUMBER else 1
+
+    def _search_made_move(self, move_number, reduction, alpha, beta, depth_left, counter, with_cut_off=True, transposition_table=None,
+                          ply=0, search_controller=None, move_orderer=None):
+        # Searches the position after the move number move_number was made in a node with depth_left and ply. Returns
+        # the score from the view of the player that made the move, the counter and the variation after it. Draws are
+        # detected by negamax() in the position after the move.
+        if reduction and ChessEngine.is_in_check(self):
+            reduction = 0
+        if move_number == 0 or not with_cut_off or alpha == -math.inf:
+            score, counter, variation = self.negamax(-beta, -alpha, depth_left - 1, counter, with_cut_off, transposition_table, ply + 1,
+                                                     search_controller, move_orderer)
+            return -score, counter, variation
+        score, counter, variation = self.negamax(-alpha - ChessBoard.NULL_WINDOW, -alpha, depth_left - 1 - reduction, counter,
+                                                 with_cut_off, transposition_table, ply + 1, search_controller, move_orderer)
+        score = -score
+        if reduction and score > alpha:
+            # The reduced search failed high, verify with the full depth
+            score, counter, variation = self.negamax(-alpha - ChessBoard.NULL_WINDOW, -alpha, depth_left - 1, counter, with_cut_off,
+                                                     transposition_table, ply + 1, search_controller, move_orderer)
+            score = -score
+        if alpha < score < beta:
+            score, counter, variation = self.negamax(-beta, -alpha, depth_left - 1, counter, with_cut_off, transposition_table,
+                                                     ply + 1, search_controller, move_orderer)
+            score = -score
+        return score, counter, variation
+
+    def _is_null_move_allowed(self, depth_left, beta, status=None):
+        if depth_left < ChessBoard.NULL_MOVE_MIN_DEPTH or beta == math.inf:
+            return False
+        # Two null moves in a row would only pass the move back
+        if self.move_stack and self.move_stack[-1][0] is None:
+            return False
+        # Zugzwang is common when only pawns and the king are left, there passing is often the best move
+        player_pieces = self.bitboards[self.current_player]
+        if not player_pieces & (self.bitboards[constants.KNIGHT] | self.bitboards[constants.BISHOP] | self.bitboards[constants.ROOK]
+                                | self.bitboards[constants.QUEEN]):
+            return False
+        # In a race to the hill a tempo decides the game
+        opponent_kings = self.bitboards[ChessBoard.get_opponent(self.current_player)] & self.bitboards[constants.KING]
+        while opponent_kings:
+            king_index = (opponent_kings & -opponent_kings).bit_length() - 1
+            if min(AttackTables.DISTANCE[king_index][hill_index] for hill_index in ChessBoard.HILL_INDICES) < ChessBoard.NULL_MOVE_MIN_HILL_DISTANCE:
+                return False
+            opponent_kings &= opponent_kings - 1
+        return self.evaluate_board(status=status) >= beta
+
+    def quiescence(self, alpha, beta, counter, search_controller=None, status=None, ply=0):
+        # Searches only captures and promotions below the horizon, so that the evaluation is not taken in the middle
+        # of an exchange. The player to move may stand pat (keep the static evaluation) unless they are in check.
+        if search_controller is not None:
+            search_controller.check()
+        if status is None:
+            status = PositionStatus(self, self.move_buffers[ply])
+        stand_pat = self.evaluate_board(status=status)
+        if status.opponent_is_on_hill:
+            return stand_pat, counter + 1
+        in_check = status.in_check
+        if not in_check:
+            if stand_pat >= beta:
+                return beta, counter + 1
+            alpha = max(alpha, stand_pat)
+        moves = self._get_quiescence_moves(status.legal_moves, in_check, alpha - stand_pat)
+        if in_check and not moves:
+            # Check mate, the evaluation contains the penalty
+            return stand_pat, counter + 1
+        for move in moves:
+            self.make_move(move)
+            score, counter = self.quiescence(-beta, -alpha, counter, search_controller, ply=ply + 1)
+            score = -score
+            self.unmake_move()
+            if score >= beta:
+                return beta, counter + 1
+            alpha = max(alpha, score)
+        return alpha, counter + 1
+
+    def _get_quiescence_moves(self, legal_moves, in_check, needed_gain):
+        # In check all evasions are searched. Otherwise the captures and promotions, best victim first, without those
+        # whose material gain can not reach needed_gain (delta pruning).
+        if in_check:
+            return legal_moves
+        moves = []
         for move in legal_moves:
-            board_after_move = copy.deepcopy(self)
-            ChessEngine.perform_move(move, board_after_move, move_type="binary", with_validation=False)
-            if ChessEngine.is_draw(legal_moves, board_after_move):
-                score = -board_after_move.evaluate_board()
-            else:
-                score, counter, _ = board_after_move.alpha_beta_max(alpha, beta, depth_left - 1, counter, with_cut_off)
-            if score <= alpha and with_cut_off:
-                return alpha, counter+1, None
-            if score < beta:
-                best_move = move
-                beta = score
-        return beta, counter+1, best_move
+            if not move & MoveOrderer.TACTICAL:
+                continue
+            gain = MoveOrderer.capture_gain(self, move)
+            if gain + ChessBoard.QUIESCENCE_DELTA_MARGIN > needed_gain:
+                moves.append((MoveOrderer.mvv_lva(self, move), move))
+        moves.sort(key=lambda scored_move: scored_move[0], reverse=True)
+        return [move for _, move in moves]
+
+    @staticmethod
+    def _order_moves(legal_moves, tt_move, move_orderer, board, ply):
+        if move_orderer is not None:
+            return move_orderer.order_moves(board, legal_moves, ply, tt_move)
+        return ChessBoard._order_tt_move_first(legal_moves, tt_move)
 
     @staticmethod
-    def get_opponent(player):
-        return constants.WHITE if player == constants.BLACK else constants.BLACK
+    def _order_tt_move_first(legal_moves, tt_move):
+        # Search the best move of an earlier search first, it is the most likely to cause a cut-off
+        if tt_move is not None and tt_move in legal_moves:
+            legal_moves.remove(tt_move)
+            legal_moves.insert(0, tt_move)
+        return legal_moves
 
 
 if __name__ == "__main__":
@@ -1,8 +1,11 @@
 from loguru import logger
 from IllegalMoveException import IllegalMoveException
 from ChessPrintService import ChessPrintService
+from ZobristHash import ZobristHash
+from MoveEncoding import MoveEncoding
+import AttackTables
+import PieceSquareTables
 import constants
-import copy
 
 from constants import NOT_RIGHT_EDGE, NOT_LEFT_EDGE
 
@@ -14,157 +17,80 @@ class ChessEngine():
 
     @staticmethod
     def get_pawn_moves(board):
-        empty_squares = ~(board.bitboards[constants.WHITE] | board.bitboards[constants.BLACK])
         pawn_moves = []
+        for targets, from_offset in ChessEngine._get_pawn_targets(board):
+            while targets:
+                to_square = targets & -targets
+                from_square = to_square << from_offset if from_offset > 0 else to_square >> -from_offset
+                pawn_moves.append((from_square, to_square))
+                targets &= targets - 1
+        return pawn_moves
+
+    @staticmethod
+    def _get_pawn_targets(board):
+        # Destination squares of the one step, two steps, left and right captures of the current player's pawns,
+        # each with the offset from the destination index to the index of the moving pawn
+        empty_squares = ~(board.bitboards[constants.WHITE] | board.bitboards[constants.BLACK])
 
         if board.current_player == constants.WHITE:
             one_step = (board.bitboards[constants.PAWN] & board.bitboards[constants.WHITE] & constants.NOT_TOP_EDGE) << 8 & empty_squares
-            two_steps = one_step << 8 & empty_squares
+            two_steps = one_step << 8 & empty_squares & constants.MAX_VALUE  # pawns on the 7th row must not leave the board
             captures_left = (board.bitboards[constants.PAWN] & board.bitboards[constants.WHITE] & NOT_LEFT_EDGE & constants.NOT_TOP_EDGE) << 7 & board.bitboards[
                 constants.BLACK]
             captures_right = (board.bitboards[constants.PAWN] & board.bitboards[constants.WHITE] & NOT_RIGHT_EDGE & constants.NOT_TOP_EDGE) << 9 & board.bitboards[
                 constants.BLACK]
-        else:
-            one_step = (board.bitboards[constants.PAWN] & board.bitboards[constants.BLACK] & constants.NOT_BOTTOM_EDGE) >> 8 & empty_squares
-            two_steps = one_step >> 8 & empty_squares
-            captures_left = (board.bitboards[constants.PAWN] & board.bitboards[constants.BLACK] & NOT_LEFT_EDGE & constants.NOT_BOTTOM_EDGE) >> 9 & board.bitboards[
-                constants.WHITE]
-            captures_right = (board.bitboards[constants.PAWN] & board.bitboards[constants.BLACK] & NOT_RIGHT_EDGE & constants.NOT_BOTTOM_EDGE) >> 7 & board.bitboards[
-                constants.WHITE]
-
-        moves = [
-            (one_step, "one_step"),
-            (two_steps, "two_steps"),
-            (captures_left, "captures_left"),
-            (captures_right, "captures_right"),
-        ]
-
-        for move_type in moves:
-            move, move_name = move_type
-            while move != 0:
-                to_square = move & -move
-                from_square = 0
-
-                if move_name == "one_step":
-                    from_square = (
-                        to_square >> 8 if board.current_player == constants.WHITE else to_square << 8
-                    )
-
-                if move_name == "two_steps":
-                    from_square = (
-                        to_square >> 16 if board.current_player == constants.WHITE else to_square << 16
-                    )
-
-                if move_name == "captures_left":
-                    from_square = (
-                        to_square >> 7 if board.current_player == constants.WHITE else to_square << 9
-                    )
-
-                if move_name == "captures_right":
-                    from_square = (
-                        to_square >> 9 if board.current_player == constants.WHITE else to_square << 7
-                    )
-
-                pawn_moves.append((from_square, to_square))
-                move &= move - 1
-
-        return pawn_moves
+            return (one_step, -8), (two_steps, -16), (captures_left, -7), (captures_right, -9)
+        one_step = (board.bitboards[constants.PAWN] & board.bitboards[constants.BLACK] & constants.NOT_BOTTOM_EDGE) >> 8 & empty_squares
+        two_steps = one_step >> 8 & empty_squares
+        captures_left = (board.bitboards[constants.PAWN] & board.bitboards[constants.BLACK] & NOT_LEFT_EDGE & constants.NOT_BOTTOM_EDGE) >> 9 & board.bitboards[
+            constants.WHITE]
+        captures_right = (board.bitboards[constants.PAWN] & board.bitboards[constants.BLACK] & NOT_RIGHT_EDGE & constants.NOT_BOTTOM_EDGE) >> 7 & board.bitboards[
+            constants.WHITE]
+        return (one_step, 8), (two_steps, 16), (captures_left, 9), (captures_right, 7)
 
     @staticmethod
     def _get_knight_moves(board):
-        # Define the bitboards for each player
         knights = board.bitboards[board.current_player] & board.bitboards[constants.KNIGHT]
-        occupied = board.bitboards[board.current_player]
-        empty = occupied ^ constants.MAX_VALUE
+        not_occupied = board.bitboards[board.current_player] ^ constants.MAX_VALUE
         moves = []
         while knights:
             # Get the position of the least significant set bit (i.e., the position of the current constants.KNIGHT)
             knight_pos = knights & -knights
-            # Reihenfolge: Oben dia-links, links dia-oben, rechts dia-oben, oben dia-rechts, links dia-unten, unten dia-links, unten dia-rechts, rechts dia-unten
-            knight_moves = (
-                (((NOT_LEFT_EDGE & knight_pos) << 15) & empty),
-                (((NOT_LEFT_EDGE & (NOT_LEFT_EDGE << 1) & knight_pos) << 6) & empty),
-                (((NOT_RIGHT_EDGE & (NOT_RIGHT_EDGE >> 1) & knight_pos) << 10) & empty),
-                (((NOT_RIGHT_EDGE & knight_pos) << 17) & empty),
-                (((NOT_LEFT_EDGE & (NOT_LEFT_EDGE << 1) & knight_pos) >> 10) & empty),
-                (((NOT_LEFT_EDGE & knight_pos) >> 17) & empty),
-                (((NOT_RIGHT_EDGE & knight_pos) >> 15) & empty),
-                (((NOT_RIGHT_EDGE & (NOT_RIGHT_EDGE >> 1) & knight_pos) >> 6) & empty),
-            )
-            # Convert the bitboard positions to tuples and add them to the list of moves
-            moves += [(knight_pos, dest) for dest in knight_moves if dest and 0 <= dest.bit_length() -1 < 64]
-
+            attacks = AttackTables.KNIGHT_ATTACKS[knight_pos.bit_length() - 1] & not_occupied
+            while attacks:
+                dest = attacks & -attacks
+                moves.append((knight_pos, dest))
+                attacks &= attacks - 1
             # Clear the least significant set bit (i.e., remove the current constants.KNIGHT from the bitboard)
             knights &= knights - 1
         return moves
 
     @staticmethod
     def _generate_bishop_attacks(square, opp_occupied_squares, player_occupied_squares):
-        attacks = 0
-        attack_directions = [-9, -7, 7, 9]
-
-        for direction in attack_directions:
-            possible_square = square
-            while True:
-                if (direction in [-9, 7] and (NOT_LEFT_EDGE & possible_square) == 0) or (
-                    direction in [-7, 9] and (NOT_RIGHT_EDGE & possible_square) == 0):
-                    break
-                possible_square = (possible_square << direction if direction > 0 else possible_square >> -direction)
-                # Check if the square is within the board
-                if not (0 <= possible_square.bit_length() - 1 < 64):
-                    break
-                if possible_square & opp_occupied_squares:  # Stop if the square is occupied
-                    attacks |= possible_square
-                    break
-                if possible_square & player_occupied_squares:
-                    break
-                # print_bitboard("Possible Sq: ", possible_square)
-                attacks |= possible_square
-        return attacks
+        index = square.bit_length() - 1
+        occupied = (opp_occupied_squares | player_occupied_squares) & AttackTables.BISHOP_MASKS[index]
+        return AttackTables.BISHOP_ATTACKS[index][occupied] & ~player_occupied_squares
 
     @staticmethod
     def _generate_rook_attacks(square, opp_occupied_squares, player_occupied_squares):
-        attacks = 0
-        attack_directions = [-8, -1, 1, 8]
-
-        for direction in attack_directions:
-            possible_square = square
-            while True:
-                if (direction == -1 and (NOT_LEFT_EDGE & possible_square) == 0) or (
-                    direction == 1 and (NOT_RIGHT_EDGE & possible_square) == 0):
-                    break
-                possible_square = (possible_square << direction if direction > 0 else possible_square >> -direction)
-                # Check if the square is within the board
-                if not (0 <= possible_square.bit_length() - 1 < 64):
-                    break
-                if possible_square & opp_occupied_squares:  # Stop if the square is occupied
-                    attacks |= possible_square
-                    break
-                if possible_square & player_occupied_squares:
-                    break
-                attacks |= possible_square
-        return attacks
+        index = square.bit_length() - 1
+        occupied = (opp_occupied_squares | player_occupied_squares) & AttackTables.ROOK_MASKS[index]
+        return AttackTables.ROOK_ATTACKS[index][occupied] & ~player_occupied_squares
 
     @staticmethod
     def _get_king_moves(board):
         king_moves = []
-        king_attack_offsets = (-9, -8, -7, -1, 1, 7, 8, 9)
         king_position = board.bitboards[constants.KING] & board.bitboards[board.current_player]
+        not_occupied = board.bitboards[board.current_player] ^ constants.MAX_VALUE
 
         while king_position:
             from_square = king_position & -king_position
-            for offset in king_attack_offsets:
-                to_square = from_square << offset if offset > 0 else from_square >> -offset
-                # Check if the move is within the board
-                if (offset in [-9, 7, -1] and (NOT_LEFT_EDGE & from_square) == 0) or (
-                    offset in [-7, 9, 1] and (NOT_RIGHT_EDGE & from_square) == 0):
-                    continue
-                if not to_square or not (0 <= to_square.bit_length() - 1 < 64):
-                    continue
-                # Check if the move captures an opponent's piece or is an empty square
-                if to_square & board.bitboards[board.current_player] != 0:
-                    continue
+            # Moves to empty squares or captures of an opponent's piece
+            attacks = AttackTables.KING_ATTACKS[from_square.bit_length() - 1] & not_occupied
+            while attacks:
+                to_square = attacks & -attacks
                 king_moves.append((from_square, to_square))
+                attacks &= attacks - 1
             king_position &= king_position - 1
         return king_moves
 
@@ -172,16 +98,19 @@ class ChessEngine():
     def get_move_by_figure(board, figure):
         figure_moves = []
         figures = board.bitboards[figure] & board.bitboards[board.current_player]
+        occupied = board.bitboards[constants.WHITE] | board.bitboards[constants.BLACK]
+        not_occupied = board.bitboards[board.current_player] ^ constants.MAX_VALUE
 
         while figures:
             from_square = figures & -figures
+            index = from_square.bit_length() - 1
             if figure == constants.ROOK:
-                attacks = ChessEngine._generate_rook_attacks(from_square, board.bitboards[constants.WHITE] if board.current_player != constants.WHITE else board.bitboards[constants.BLACK], board.bitboards[board.current_player])
+                attacks = AttackTables.ROOK_ATTACKS[index][occupied & AttackTables.ROOK_MASKS[index]]
             elif figure == constants.BISHOP:
-                attacks = ChessEngine._generate_bishop_attacks(from_square, board.bitboards[constants.WHITE] if board.current_player != constants.WHITE else board.bitboards[constants.BLACK], board.bitboards[board.current_player])
+                attacks = AttackTables.BISHOP_ATTACKS[index][occupied & AttackTables.BISHOP_MASKS[index]]
             elif figure == constants.QUEEN:
-                attacks = ChessEngine._generate_rook_attacks(from_square, board.bitboards[constants.WHITE] if board.current_player != constants.WHITE else board.bitboards[constants.BLACK], board.bitboards[board.current_player])
-                attacks |= ChessEngine._generate_bishop_attacks(from_square,board.bitboards[constants.WHITE] if board.current_player != constants.WHITE else board.bitboards[constants.BLACK], board.bitboards[board.current_player])
+                attacks = AttackTables.ROOK_ATTACKS[index][occupied & AttackTables.ROOK_MASKS[index]]
+                attacks |= AttackTables.BISHOP_ATTACKS[index][occupied & AttackTables.BISHOP_MASKS[index]]
             elif figure == constants.KING:
                 return ChessEngine._get_king_moves(board)
             elif figure == constants.PAWN:
@@ -190,6 +119,7 @@ class ChessEngine():
                 return ChessEngine._get_knight_moves(board)
             else:
                 logger.error("Unknown figure: ", figure)
+            attacks &= not_occupied
 
             while attacks:
                 to_square = attacks & -attacks
@@ -202,46 +132,64 @@ class ChessEngine():
 
     @staticmethod
     def perform_move(move, board, move_type="algebraic", with_validation=True):
+        # move_type: "algebraic" ("e2e4"), "binary" ((from_square, to_square)) or "encoded" (MoveEncoding integer)
         if move_type == "algebraic":
             move = ChessEngine.algebraic_move_to_binary(move)
+        if move_type == "encoded":
+            from_square = 1 << (move & MoveEncoding.SQUARE_MASK)
+            to_square = 1 << ((move >> MoveEncoding.TO_SHIFT) & MoveEncoding.SQUARE_MASK)
+        else:
+            from_square, to_square = move
         if with_validation:
-            legal_moves = ChessEngine.filter_illegal_moves(board, ChessEngine.generate_moves(board))
-            if move not in legal_moves and move_type != "algebraic":
-                raise IllegalMoveException(ChessEngine.binary_move_to_algebraic(move[0], move[1]))
-            if move not in legal_moves:
-                raise IllegalMoveException(ChessEngine.binary_move_to_algebraic(move[0], move[1]))
-        from_square, to_square = move
+            legal_moves = ChessEngine.generate_legal_moves(board)
+            if (from_square, to_square) not in legal_moves:
+                raise IllegalMoveException(ChessEngine.binary_move_to_algebraic(from_square, to_square))
         opponent = board.get_opponent(board.current_player)
-
-        if board.bitboards[board.current_player] & from_square:
-            board.bitboards[board.current_player] &= (from_square ^ constants.MAX_VALUE)
-            board.bitboards[opponent] &= (to_square ^ constants.MAX_VALUE)
-            board.bitboards[board.current_player] |= to_square
-        elif board.bitboards[opponent] & from_square:
-            board.bitboards[opponent] &= (from_square ^ constants.MAX_VALUE)
-            board.bitboards[board.current_player] &= (to_square ^ constants.MAX_VALUE)
-            board.bitboards[opponent] |= to_square
+        from_index = from_square.bit_length() - 1
+        to_index = to_square.bit_length() - 1
+        bitboards = board.bitboards
+        mailbox = board.mailbox
+        # Remember everything that is needed to take the move back in ChessBoard.unmake_move()
+        moved_code = mailbox[from_index]
+        captured_code = mailbox[to_index]
+        moved_piece = moved_code >> 1 if moved_code else None
+        captured_piece = captured_code >> 1 if captured_code else None
+        previous_player = board.current_player
+        previous_pawn_not_moved_counter = board.pawn_not_moved_counter
+        previous_hash_key = board.hash_key
+
+        # Update the position key and the piece-square sums: the moving piece, a captured piece and the side to move
+        if captured_piece is not None:
+            captured_color = captured_code & 1
+            board.hash_key ^= ZobristHash.piece_key(captured_color, captured_piece, to_square)
+            board.pst_score[captured_color] -= PieceSquareTables.PST[captured_piece][to_index]
+            # Remove the captured piece from the destination
+            bitboards[captured_piece] ^= to_square
+            bitboards[captured_color] ^= to_square
+        if moved_piece is not None:
+            moved_color = moved_code & 1
+            board.hash_key ^= ZobristHash.piece_key(moved_color, moved_piece, from_square) ^ ZobristHash.piece_key(moved_color, moved_piece, to_square)
+            board.pst_score[moved_color] += PieceSquareTables.PST[moved_piece][to_index] - PieceSquareTables.PST[moved_piece][from_index]
+            # Move the piece from its original position to the new one
+            bitboards[moved_piece] ^= from_square | to_square
+            bitboards[moved_color] ^= from_square | to_square
+            mailbox[to_index] = moved_code
+            mailbox[from_index] = 0
         else:
             logger.error("Error in method perform_move(). There is no figure on th eposition from_square: {}", ChessEngine.binary_field_to_algebraic(from_square))
+        board.hash_key ^= ZobristHash.BLACK_TO_MOVE_KEY
 
-        for piece in range(constants.PAWN, constants.KING + 1):
-            # Remove a possibly captured piece from the destination
-            board.bitboards[piece] &= (to_square ^ constants.MAX_VALUE)
-            if board.bitboards[piece] & from_square:
-                # Remove the moving piece from its original position
-                board.bitboards[piece] &= (from_square ^ constants.MAX_VALUE)
-                # Move the piece to the new position
-                board.bitboards[piece] |= to_square
-        
         # convert the pawn if it moves to last row
-        ChessEngine._convert_pawn(board, to_square)
+        promoted = ChessEngine._convert_pawn(board, to_square)
         # Switch the current player
         board.current_player = opponent
-        # Add board to history for draw by repitition
-        copied_chessBoard = copy.deepcopy(board)
-        board.board_history.append(copied_chessBoard.bitboards)
+        # Count the position for draw by repitition
+        board.position_counts[board.hash_key] = board.position_counts.get(board.hash_key, 0) + 1
         # Increase pawn counter for draw by 50 moves
-        board.pawn_not_moved_counter = 0 if (from_square & board.bitboards[constants.PAWN]) != 0 else board.pawn_not_moved_counter + 1
+        board.pawn_not_moved_counter = 0 if moved_piece == constants.PAWN else board.pawn_not_moved_counter + 1
+        board.move_stack.append((from_square, to_square, moved_piece, captured_piece, previous_player, previous_pawn_not_moved_counter, promoted, previous_hash_key))
+        # Debug check, skipped with python -O
+        assert not with_validation or board.verify_mailbox()
 
     @staticmethod
     def _convert_pawn(board, to_square):
@@ -254,48 +202,218 @@ class ChessEngine():
             best_convertable_figure = constants.QUEEN
             board.bitboards[constants.PAWN] &= ~to_square
             board.bitboards[best_convertable_figure] |= to_square
-        
+            color = constants.WHITE if board.bitboards[constants.WHITE] & to_square else constants.BLACK
+            board.mailbox[to_square.bit_length() - 1] = (best_convertable_figure << 1) | color
+            board.hash_key ^= ZobristHash.piece_key(color, constants.PAWN, to_square) ^ ZobristHash.piece_key(color, best_convertable_figure, to_square)
+            board.pst_score[color] += (PieceSquareTables.PST[best_convertable_figure][to_square.bit_length() - 1]
+                                       - PieceSquareTables.PST[constants.PAWN][to_square.bit_length() - 1])
+            return True
+        return False
 
     @staticmethod
     def is_in_check(board, isOpponent=False):
-        # move is a tuple containing start and destination bitboards, checks if input player is in check
-        # TODO: king - king face off not included yet
+        # checks if the king of the current player (or of the opponent) is attacked
         player = board.current_player if not isOpponent else board.get_opponent(board.current_player)
-        boardOpponent = copy.deepcopy(board)
-        boardOpponent.current_player = board.get_opponent(player)
-        legal_moves_opponent = ChessEngine.generate_moves(boardOpponent)
-        dest_legal_moves = [elem[1] for elem in legal_moves_opponent]
-        in_check = [dest & (board.bitboards[constants.KING] & board.bitboards[player]) for dest in
-                    dest_legal_moves]
-        return any(elem != 0 for elem in in_check)
+        opponent = board.get_opponent(player)
+        kings = board.bitboards[constants.KING] & board.bitboards[player]
+        while kings:
+            if ChessEngine.is_square_attacked(board, kings & -kings, opponent):
+                return True
+            kings &= kings - 1
+        return False
+
+    @staticmethod
+    def is_square_attacked(board, square, by_color):
+        # Looks outward from the square: it is attacked if a piece of by_color stands on a square, from which the
+        # same kind of piece on the given square could attack it
+        attackers = board.bitboards[by_color]
+        index = square.bit_length() - 1
+        if AttackTables.KNIGHT_ATTACKS[index] & attackers & board.bitboards[constants.KNIGHT]:
+            return True
+        if AttackTables.KING_ATTACKS[index] & attackers & board.bitboards[constants.KING]:
+            return True
+        if AttackTables.PAWN_ATTACKS[board.get_opponent(by_color)][index] & attackers & board.bitboards[constants.PAWN]:
+            return True
+        occupied = board.bitboards[constants.WHITE] | board.bitboards[constants.BLACK]
+        rooks_and_queens = attackers & (board.bitboards[constants.ROOK] | board.bitboards[constants.QUEEN])
+        if rooks_and_queens and ChessEngine._generate_rook_attacks(square, occupied, 0) & rooks_and_queens:
+            return True
+        bishops_and_queens = attackers & (board.bitboards[constants.BISHOP] | board.bitboards[constants.QUEEN])
+        if bishops_and_queens and ChessEngine._generate_bishop_attacks(square, occupied, 0) & bishops_and_queens:
+            return True
+        return False
+
+    @staticmethod
+    def _get_attackers(board, square, by_color, occupied):
+        # Bitboard of all pieces of by_color that attack the square, sliding pieces are blocked by occupied
+        index = square.bit_length() - 1
+        return board.bitboards[by_color] & (
+            (AttackTables.KNIGHT_ATTACKS[index] & board.bitboards[constants.KNIGHT])
+            | (AttackTables.KING_ATTACKS[index] & board.bitboards[constants.KING])
+            | (AttackTables.PAWN_ATTACKS[board.get_opponent(by_color)][index] & board.bitboards[constants.PAWN])
+            | (ChessEngine._generate_rook_attacks(square, occupied, 0) & (board.bitboards[constants.ROOK] | board.bitboards[constants.QUEEN]))
+            | (ChessEngine._generate_bishop_attacks(square, occupied, 0) & (board.bitboards[constants.BISHOP] | board.bitboards[constants.QUEEN]))
+        )
+
+    @staticmethod
+    def _get_check_and_pin_masks(board, kings):
+        # For a player with a single king: the squares a piece other than the king may move to (all, the checking
+        # piece and the squares between it and the king, or none in double check) and the line each pinned piece
+        # has to stay on, by pinned square
+        player = board.current_player
+        opponent = board.get_opponent(player)
+        own = board.bitboards[player]
+        occupied = own | board.bitboards[opponent]
+        king_index = kings.bit_length() - 1
+
+        checkers = ChessEngine._get_attackers(board, kings, opponent, occupied)
+        if checkers & (checkers - 1):
+            # Double check: only the king can move
+            evasion_squares = 0
+        elif checkers:
+            # Single check: capture the checking piece or block the line to the king
+            evasion_squares = checkers | AttackTables.BETWEEN[king_index][checkers.bit_length() - 1]
+        else:
+            evasion_squares = constants.MAX_VALUE
+
+        # A piece is pinned if it is the only piece between the king and a sliding piece of the opponent
+        pin_rays = {}
+        pinners = board.bitboards[opponent] & (
+            (AttackTables.ROOK_RAYS[king_index] & (board.bitboards[constants.ROOK] | board.bitboards[constants.QUEEN]))
+            | (AttackTables.BISHOP_RAYS[king_index] & (board.bitboards[constants.BISHOP] | board.bitboards[constants.QUEEN]))
+        )
+        while pinners:
+            pinner_index = (pinners & -pinners).bit_length() - 1
+            blockers = AttackTables.BETWEEN[king_index][pinner_index] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pin_rays[blockers] = AttackTables.LINE[king_index][pinner_index]
+            pinners &= pinners - 1
+        return opponent, occupied, evasion_squares, pin_rays
+
+    @staticmethod
+    def generate_encoded_legal_moves(board, buffer):
+        # Writes the legal moves of the current player as MoveEncoding integers into buffer (an array with room for
+        # MoveEncoding.MAX_MOVES moves, see MoveBuffers) and returns their number. The moves and their order are the
+        # same as of generate_legal_moves(), but no move list or tuple is created.
+        player = board.current_player
+        kings = board.bitboards[constants.KING] & board.bitboards[player]
+        if not kings or kings & (kings - 1):
+            legal_moves = ChessEngine.generate_legal_moves(board)
+            for count, move in enumerate(legal_moves):
+                buffer[count] = MoveEncoding.encode(board, move)
+            return len(legal_moves)
+        opponent, occupied, evasion_squares, pin_rays = ChessEngine._get_check_and_pin_masks(board, kings)
+        bitboards = board.bitboards
+        enemy = bitboards[opponent]
+        count = 0
+
+        for targets, from_offset in ChessEngine._get_pawn_targets(board):
+            targets &= evasion_squares
+            while targets:
+                to_square = targets & -targets
+                to_index = to_square.bit_length() - 1
+                from_index = to_index + from_offset
+                if 1 << from_index not in pin_rays or to_square & pin_rays[1 << from_index]:
+                    encoded_move = from_index | (to_index << MoveEncoding.TO_SHIFT)
+                    if to_square & enemy:
+                        encoded_move |= MoveEncoding.CAPTURE
+                    if to_square & MoveEncoding._PROMOTION_SQUARES:
+                        encoded_move |= MoveEncoding.PROMOTION
+                    buffer[count] = encoded_move
+                    count += 1
+                targets &= targets - 1
+
+        not_own = bitboards[player] ^ constants.MAX_VALUE
+        for figure in (constants.KNIGHT, constants.BISHOP, constants.ROOK, constants.QUEEN):
+            figures = bitboards[figure] & bitboards[player]
+            while figures:
+                from_square = figures & -figures
+                from_index = from_square.bit_length() - 1
+                if figure == constants.KNIGHT:
+                    attacks = AttackTables.KNIGHT_ATTACKS[from_index]
+                elif figure == constants.BISHOP:
+                    attacks = AttackTables.BISHOP_ATTACKS[from_index][occupied & AttackTables.BISHOP_MASKS[from_index]]
+                elif figure == constants.ROOK:
+                    attacks = AttackTables.ROOK_ATTACKS[from_index][occupied & AttackTables.ROOK_MASKS[from_index]]
+                else:
+                    attacks = (AttackTables.ROOK_ATTACKS[from_index][occupied & AttackTables.ROOK_MASKS[from_index]]
+                               | AttackTables.BISHOP_ATTACKS[from_index][occupied & AttackTables.BISHOP_MASKS[from_index]])
+                attacks &= not_own & evasion_squares
+                if from_square in pin_rays:
+                    attacks &= pin_rays[from_square]
+                while attacks:
+                    to_square = attacks & -attacks
+                    buffer[count] = (from_index | ((to_square.bit_length() - 1) << MoveEncoding.TO_SHIFT)
+                                     | (MoveEncoding.CAPTURE if to_square & enemy else 0))
+                    count += 1
+                    attacks &= attacks - 1
+                figures &= figures - 1
+
+        # The king must not move to an attacked square, it does not block the line of a slider anymore
+        king_index = kings.bit_length() - 1
+        attacks = AttackTables.KING_ATTACKS[king_index] & not_own
+        while attacks:
+            to_square = attacks & -attacks
+            if not ChessEngine._get_attackers(board, to_square, opponent, occupied ^ kings) & ~to_square:
+                buffer[count] = (king_index | ((to_square.bit_length() - 1) << MoveEncoding.TO_SHIFT)
+                                 | (MoveEncoding.CAPTURE if to_square & enemy else 0))
+                count += 1
+            attacks &= attacks - 1
+        return count
+
+    @staticmethod
+    def generate_legal_moves(board, with_pin_detection=True):
+        # Legal moves of the current player. Checking pieces and pinned pieces are determined once for the position,
+        # so no move has to be performed to test it. with_pin_detection=False uses the old way of performing every
+        # pseudo-legal move and testing for check afterwards (for differential testing).
+        moves = ChessEngine.generate_moves(board)
+        player = board.current_player
+        kings = board.bitboards[constants.KING] & board.bitboards[player]
+        if not with_pin_detection or kings & (kings - 1):
+            return ChessEngine.filter_illegal_moves(board, moves)
+        if not kings:
+            # Without a king every move is legal
+            return moves
+
+        opponent, occupied, evasion_squares, pin_rays = ChessEngine._get_check_and_pin_masks(board, kings)
+
+        legal_moves = []
+        for move in moves:
+            from_square, to_square = move
+            if from_square == kings:
+                # The king must not move to an attacked square, it does not block the line of a slider anymore
+                if not ChessEngine._get_attackers(board, to_square, opponent, occupied ^ kings) & ~to_square:
+                    legal_moves.append(move)
+            elif to_square & evasion_squares and (from_square not in pin_rays or to_square & pin_rays[from_square]):
+                legal_moves.append(move)
+        return legal_moves
 
     @staticmethod
     def is_check_mate(board):
         # checks if current player is in check mate --> current player lost
-        if not ChessEngine.is_in_check(board):
+        if not ChessEngine.is_in_check(board) or ChessEngine.generate_legal_moves(board):
             return False
-        legal_moves = ChessEngine.generate_moves(board)
-        for move in legal_moves:
-            board_after_move = copy.deepcopy(board)
-            ChessEngine.perform_move(move, board_after_move, move_type="binary", with_validation=False)
-            if not ChessEngine.is_in_check(board_after_move, isOpponent=True):
-                board.game_result = board.get_opponent(board.current_player)
-                return False
+        board.game_result = board.get_opponent(board.current_player)
         return True
     
     @staticmethod
     def opponent_is_check_mate(board):
         # checks if opponent is in check mate --> opponent lost
-        if not ChessEngine.is_in_check(board, isOpponent=True):
+        if not ChessEngine.is_in_check(board, isOpponent=True) or ChessEngine._can_escape_check(board):
             return False
-        legal_moves = ChessEngine.generate_moves(board)
-        for move in legal_moves:
-            board_after_move = copy.deepcopy(board)
-            ChessEngine.perform_move(move, board_after_move, move_type="binary", with_validation=False)
-            if not ChessEngine.is_in_check(board_after_move, isOpponent=False):
-                board.game_result = board.current_player
-                return False
+        board.game_result = board.current_player
         return True
+
+    @staticmethod
+    def _can_escape_check(board):
+        # Is there a move after which the current player is not in check
+        for move in ChessEngine.generate_moves(board):
+            board.make_move(move)
+            escapes_check = not ChessEngine.is_in_check(board, isOpponent=False)
+            board.unmake_move()
+            if escapes_check:
+                return True
+        return False
     
     @staticmethod
     def opponent_is_king_on_the_hill(board):
@@ -310,11 +428,11 @@ class ChessEngine():
     @staticmethod
     def is_draw(legal_moves, board):
         # TODO: There is one more draw rule "50-Züge-Regel"
-        if not legal_moves and not board.is_in_check(board):
+        if not legal_moves and not ChessEngine.is_in_check(board):
             print("Draw by Patt!")
             board.game_result = constants.DRAW
             return True
-        if ChessEngine._is_repetition_draw(board.board_history):
+        if ChessEngine._is_repetition_draw(board):
             print("Draw by repetition!")
             board.game_result = constants.DRAW
             return True
@@ -329,14 +447,12 @@ class ChessEngine():
         return ChessEngine.is_check_mate(board) or ChessEngine.opponent_is_king_on_the_hill(board) or ChessEngine.opponent_is_check_mate(board)
 
     @staticmethod
-    def _is_repetition_draw(board_list):
+    def _is_repetition_draw(board):
         # Wenn in einer Schachpartie dreimal die exakt gleiche Stellung auf dem Brett auftritt, endet die Partie in einem Remis. 
         # Mit exakt ist gemeint, dass jeweils der gleiche Spieler am Zug sein muss. Optionen wie das Rochaderecht oder En passant müssen ebenfalls identisch sein.
         # TODO: include rochade, ...
-        for sublist in board_list:
-            if board_list.count(sublist) > 2:
-                return True
-        return False
+        # Positions from before the last pawn move or capture can not occur again, so only the count of the current position matters.
+        return board.position_counts.get(board.hash_key, 0) > 2
 
     @staticmethod
     def algebraic_move_to_binary(move):
@@ -364,9 +480,9 @@ class ChessEngine():
 
     @staticmethod
     def is_move_legal(move, board):
-        board_after_move = copy.deepcopy(board)
-        ChessEngine.perform_move(move, board_after_move, move_type="binary", with_validation=False)
-        is_in_check = ChessEngine.is_in_check(board_after_move, isOpponent=True)
+        board.make_move(move)
+        is_in_check = ChessEngine.is_in_check(board, isOpponent=True)
+        board.unmake_move()
         return not is_in_check
 
     @staticmethod
@@ -1,39 +1,75 @@
 from ChessPrintService import ChessPrintService
 from ChessBoard import ChessBoard
 from ChessEngine import ChessEngine
+from PositionStatus import PositionStatus
+from TranspositionTable import TranspositionTable
+from SearchController import SearchController
+from ParallelSearch import ParallelSearch
+from LazySmpSearch import LazySmpSearch
+from OpeningBook import OpeningBook
+from EndgameTablebase import EndgameTablebase
 import constants
+import random
 import re
 from loguru import logger
 import sys
+import time
 
 
 class ChessGame:
-    def __init__(self, board, isBlackAI=True, isWhiteAI=True):
+    def __init__(self, board, isBlackAI=True, isWhiteAI=True, tt_size_mb=16, time_per_game=None, increment=0, processes=None,
+                 lazy_smp=False, opening_book=None, tablebase=None):
         self.board = board
         self.move_number = 1
         self.isBlackAI = isBlackAI
         self.isWhiteAI = isWhiteAI
         self.currentLegalMoves = []
+        # Shared by all searches of this game, its size stays fixed
+        self.transposition_table = TranspositionTable(tt_size_mb)
+        # Game clock in seconds for [white, black], None means the AI searches without time limit
+        self.remaining_time = None if time_per_game is None else [time_per_game, time_per_game]
+        self.increment = increment
+        # Expected continuation of the last AI search, best move first
+        self.principal_variation = []
+        # Worker processes, started once and kept for all moves of the game. They either split the root moves or all
+        # search the whole tree with a shared transposition table (lazy SMP).
+        self.parallel_search = None
+        self.lazy_smp_search = None
+        if processes is not None and processes > 1:
+            if lazy_smp:
+                self.lazy_smp_search = LazySmpSearch(processes, tt_size_mb)
+            else:
+                self.parallel_search = ParallelSearch(processes, tt_size_mb)
+        # Path of an OpeningBook file, its moves are played without a search while the position is in the book
+        self.opening_book = OpeningBook(opening_book) if opening_book is not None else None
+        self.book_random_generator = random.Random()
+        # Directory of EndgameTablebase files, probed by the search of this process (not by the worker processes)
+        if tablebase is not None:
+            self.board.tablebase = EndgameTablebase(tablebase)
 
     def play(self):
         while True:
             if self.process_next_move() == "checkmate" or self.process_next_move() == "draw":
                 break
 
-    def process_next_move(self, max_depth=3, print_board=True, with_cut_off=True):
+    def process_next_move(self, max_depth=3, print_board=True, with_cut_off=True, time_limit=None):
         if print_board:
             self.print_board()
-        self.currentLegalMoves = self.get_legal_moves()
         # Check for draw and checkmate before the move is exercised
-        if ChessEngine.is_draw(self.currentLegalMoves, self.board):  # more detailed print is in draw function
+        status = PositionStatus(self.board)
+        self.currentLegalMoves = status.legal_moves
+        if status.result is not None:
+            self.board.game_result = status.result
+        if status.result == constants.DRAW:
+            print(f"Draw by {status.reason}!")
             return "draw"
-        if ChessEngine.is_check_mate() or ChessEngine.opponent_is_king_on_the_hill(self.board):
-            winner = "White" if self.board.game_result == constants.WHITE else "Black"
-            print("Checkmate! Winner is ", winner)
+        if status.result is not None:
+            winner = "White" if status.result == constants.WHITE else "Black"
+            print(f"Game over by {status.reason}! Winner is ", winner)
             return "checkmate"
         
         if self.is_ai_turn():
-            move, counter = self.get_ai_move(max_depth, print_board, with_cut_off)
+            move, counter = self.get_ai_move(max_depth, print_board, with_cut_off, time_limit)
         else:
             move = ChessEngine.algebraic_move_to_binary(self.get_human_move())
 
@@ -60,25 +96,56 @@ class ChessGame:
         pattern = r'^[a-h][1-8][a-h][1-8]$'
         return re.match(pattern, user_input) is not None
 
-    def get_ai_move(self, max_depth, print_move=True, with_cut_off=True):
+    def get_ai_move(self, max_depth, print_move=True, with_cut_off=True, time_limit=None):
 
         if len(self.currentLegalMoves) == 0:
             logger.error("List is empty. This case should be captured as a check mate or draw!")
             return sys.exit(1)
-        best_move, counter = self.board.iterative_depth_search(max_depth, with_cut_off)
+        player = self.board.current_player
+        if time_limit is None and self.remaining_time is not None:
+            time_limit = SearchController.allocate_time(self.remaining_time[player], self.increment)
+        start_time = time.perf_counter()
+        book_move = self.opening_book.choose_move(self.board, self.book_random_generator) if self.opening_book is not None else None
+        if book_move is not None:
+            best_move, counter, self.principal_variation = book_move, 0, [book_move]
+        elif self.lazy_smp_search is not None:
+            best_move, counter, self.principal_variation = self.lazy_smp_search.search(self.board, max_depth, time_limit, with_cut_off)
+        else:
+            best_move, counter, self.principal_variation = self.board.iterative_depth_search(max_depth, time_limit, with_cut_off=with_cut_off,
+                                                                                             transposition_table=self.transposition_table,
+                                                                                             parallel_search=self.parallel_search)
+        if self.remaining_time is not None:
+            self.remaining_time[player] += self.increment - (time.perf_counter() - start_time)
         str = "White" if self.board.current_player == constants.WHITE else "Black"
         if print_move:
-            print(f"Move {self.move_number} by {str} (AI): {ChessEngine.binary_move_to_algebraic(best_move[0], best_move[1])}")
+            variation = " ".join(ChessEngine.binary_move_to_algebraic(move[0], move[1]) for move in self.principal_variation)
+            source = "book" if book_move is not None else f"PV: {variation}"
+            print(f"Move {self.move_number} by {str} (AI): {ChessEngine.binary_move_to_algebraic(best_move[0], best_move[1])} ({source})")
         return best_move, counter
 
+    def close(self):
+        # Stops the worker processes of the parallel search and frees the shared memory
+        if self.parallel_search is not None:
+            self.parallel_search.close()
+            self.parallel_search = None
+        if self.lazy_smp_search is not None:
+            self.lazy_smp_search.close()
+            self.lazy_smp_search = None
+        if self.opening_book is not None:
+            self.opening_book.close()
+            self.opening_book = None
+        if self.board.tablebase is not None:
+            self.board.tablebase.close()
+            self.board.tablebase = None
+
     def get_legal_moves(self):
-        moves = ChessEngine.generate_moves(self.board)
-        legal_moves = ChessEngine.filter_illegal_moves(self.board, moves)
-        return legal_moves
+        return ChessEngine.generate_legal_moves(self.board)
 
     def perform_move(self, move):
         if move in self.currentLegalMoves:
             ChessEngine.perform_move(move, self.board, move_type="binary", with_validation=False)
+            # Debug check of the mailbox once per game move, skipped with python -O
+            assert self.board.verify_mailbox()
             self.move_number += 1
         else:
             print("Valid input, but invalid move. Enter a move of the form a1a2 (start square->destination square).")
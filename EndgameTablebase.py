@@ -0,0 +1,419 @@
+import argparse
+import mmap
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import AttackTables
+from ChessEngine import ChessEngine
+from Position import Position
+from PositionStatus import PositionStatus
+import constants
+
+
+def _classify_chunk(directory, signature, start, stop):
+    # Worker of EndgameTablebase.generate(): the positions start..stop of a table before the retrograde analysis, see
+    # EndgameTablebase._classify()
+    tablebase = EndgameTablebase(directory)
+    try:
+        return EndgameTablebase._classify(tablebase, EndgameTablebase._parse_signature(signature), start, stop)
+    finally:
+        tablebase.close()
+
+
+class EndgameTablebase:
+    """
+    Endgame tables for positions with few pieces: for every position of a material signature like "KQvK" (the white
+    pieces, "v", the black pieces) the result with the player to move and the number of plies until the game ends,
+    under the rules of this project: a king on the hill wins, pawns are converted to queens, no castling and no en
+    passant. Draws by repetition and by the 50 moves rule are not part of the tables.
+
+    A table has one byte per position: 0 for a draw, INVALID for a position that can not occur (two pieces on one
+    square, a pawn on the first or last row, the player not to move in check, the player to move already on the hill),
+    else the distance to the end of the game + 1. An odd distance is a win of the player to move, an even one a loss
+    (distance 0: check mate or the opponent on the hill). The index of a position is the player to move and the squares
+    of the pieces in signature order, 6 bits each. The tables are files named after the signature in one directory,
+    which are memory-mapped on first use.
+
+    generate() writes the tables by retrograde analysis. A process pool classifies the positions in chunks (terminal
+    positions, the number of moves within the table, the results after captures and conversions from the smaller
+    tables) and writes every chunk to disk, so an interrupted generation continues with the missing chunks and the
+    tables already written. Then the results are propagated backwards from the terminal positions by taking moves
+    back, a distance at a time.
+    """
+
+    PIECES = {"K": constants.KING, "Q": constants.QUEEN, "R": constants.ROOK, "B": constants.BISHOP, "N": constants.KNIGHT,
+              "P": constants.PAWN}
+    PIECE_LETTERS = {piece: letter for letter, piece in PIECES.items()}
+    # Order of the pieces of one colour in a signature
+    PIECE_RANKS = {piece: rank for rank, piece in enumerate(PIECES.values())}
+
+    DRAW = 0
+    INVALID = 255
+    MAX_DISTANCE = 253
+    MAX_PIECES = 4
+    CHUNK_SIZE = 1 << 15
+    FILE_EXTENSION = ".tb"
+    # Score of a won position in the search, minus the distance: above every evaluation, faster wins score higher
+    WIN_SCORE = 1000
+
+    _NO_DISTANCE = 255
+    _PAWN_ROWS = (constants.NOT_TOP_EDGE & constants.NOT_BOTTOM_EDGE) ^ constants.MAX_VALUE
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Memory-mapped table by signature, None for a table that is not on disk
+        self._tables = {}
+        self._files = []
+        self.max_pieces = 0
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(EndgameTablebase.FILE_EXTENSION):
+                    self.max_pieces = max(self.max_pieces, len(name) - len(EndgameTablebase.FILE_EXTENSION) - 1)
+
+    def close(self):
+        for table in self._tables.values():
+            if table is not None:
+                table.close()
+        for file in self._files:
+            file.close()
+        self._tables = {}
+        self._files = []
+
+    def probe(self, board):
+        # (result, distance) of the position: the winner or constants.DRAW as in ChessBoard.game_result and the plies
+        # until the game ends. None if there is no table for the position.
+        occupied = board.bitboards[constants.WHITE] | board.bitboards[constants.BLACK]
+        if occupied.bit_count() > self.max_pieces:
+            return None
+        pieces = []
+        while occupied:
+            index = (occupied & -occupied).bit_length() - 1
+            code = board.mailbox[index]
+            pieces.append((code & 1, code >> 1, index))
+            occupied &= occupied - 1
+        signature, index = EndgameTablebase._get_signature_and_index(pieces, board.current_player)
+        value = self._get_value(signature, index)
+        if value is None or value == EndgameTablebase.INVALID:
+            return None
+        if value == EndgameTablebase.DRAW:
+            return constants.DRAW, 0
+        distance = value - 1
+        if distance % 2:
+            return board.current_player, distance
+        return board.get_opponent(board.current_player), distance
+
+    def get_score(self, board):
+        # Exact score of the position for the player to move, None if there is no table for it
+        entry = self.probe(board)
+        if entry is None:
+            return None
+        result, distance = entry
+        if result == constants.DRAW:
+            return 0
+        if result == board.current_player:
+            return EndgameTablebase.WIN_SCORE - distance
+        return distance - EndgameTablebase.WIN_SCORE
+
+    def _get_value(self, signature, index):
+        if signature not in self._tables:
+            self._tables[signature] = self._open_table(signature)
+        table = self._tables[signature]
+        return table[index] if table is not None else None
+
+    def _open_table(self, signature):
+        path = EndgameTablebase._get_path(self.directory, signature)
+        if not os.path.exists(path):
+            return None
+        file = open(path, "rb")
+        self._files.append(file)
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def generate(directory, signature, processes=None):
+        # Writes the table of the signature and the smaller tables it needs, tables already on disk are kept.
+        # Returns the path of the table.
+        pieces = EndgameTablebase._parse_signature(signature)
+        signature = EndgameTablebase._get_signature(pieces)
+        path = EndgameTablebase._get_path(directory, signature)
+        if os.path.exists(path):
+            return path
+        for successor in EndgameTablebase._get_successor_signatures(pieces):
+            EndgameTablebase.generate(directory, successor, processes)
+
+        chunk_directory = path + ".chunks"
+        os.makedirs(chunk_directory, exist_ok=True)
+        size = 2 * 64 ** len(pieces)
+        chunks = [(start, min(start + EndgameTablebase.CHUNK_SIZE, size)) for start in range(0, size, EndgameTablebase.CHUNK_SIZE)]
+        missing_chunks = [chunk for chunk in chunks if not os.path.exists(EndgameTablebase._get_chunk_path(chunk_directory, chunk[0]))]
+        if missing_chunks:
+            with ProcessPoolExecutor(max_workers=processes or os.cpu_count() or 1) as executor:
+                starts, stops = zip(*missing_chunks)
+                results = executor.map(_classify_chunk, repeat(directory), repeat(signature), starts, stops)
+                for start, result in zip(starts, results):
+                    EndgameTablebase._write_file(EndgameTablebase._get_chunk_path(chunk_directory, start), b"".join(result))
+
+        # values, in-table move counts, shortest external loss, longest external win, external draw
+        columns = [bytearray() for _ in range(5)]
+        for start, stop in chunks:
+            with open(EndgameTablebase._get_chunk_path(chunk_directory, start), "rb") as chunk_file:
+                data = chunk_file.read()
+            for column_index, column in enumerate(columns):
+                column += data[column_index * (stop - start):(column_index + 1) * (stop - start)]
+        EndgameTablebase._solve(pieces, *columns)
+        EndgameTablebase._write_file(path, columns[0])
+        for start, _ in chunks:
+            os.remove(EndgameTablebase._get_chunk_path(chunk_directory, start))
+        os.rmdir(chunk_directory)
+        return path
+
+    @staticmethod
+    def _classify(tablebase, pieces, start, stop):
+        # For the positions start..stop: the value of invalid and terminal positions (0 for the others), the number of
+        # legal moves that stay in the table, the shortest distance to a loss and the longest distance to a win of the
+        # opponent after a capture or conversion, which lead to a smaller table, and whether one of them is a draw
+        count = stop - start
+        values = bytearray(count)
+        move_counts = bytearray(count)
+        external_losses = bytearray([EndgameTablebase._NO_DISTANCE]) * count
+        external_wins = bytearray(count)
+        external_draws = bytearray(count)
+        position = Position()
+        for offset in range(count):
+            squares = EndgameTablebase._load_position(position, pieces, start + offset)
+            if squares is None or not EndgameTablebase._is_valid(position):
+                values[offset] = EndgameTablebase.INVALID
+                continue
+            status = PositionStatus(position)
+            result = status.get_result()[0]
+            if result == constants.DRAW:
+                continue
+            if result is not None:
+                # The player to move lost
+                values[offset] = 1
+                continue
+            opponent = position.get_opponent(position.current_player)
+            for from_square, to_square in status.legal_moves:
+                from_index = from_square.bit_length() - 1
+                to_index = to_square.bit_length() - 1
+                moved_piece = squares.index(from_index)
+                is_conversion = pieces[moved_piece][1] == constants.PAWN and to_square & EndgameTablebase._PAWN_ROWS
+                if to_index not in squares and not is_conversion:
+                    move_counts[offset] += 1
+                    continue
+                child_pieces = []
+                for piece_index, (color, piece) in enumerate(pieces):
+                    if piece_index == moved_piece:
+                        child_pieces.append((color, constants.QUEEN if is_conversion else piece, to_index))
+                    elif squares[piece_index] != to_index:
+                        child_pieces.append((color, piece, squares[piece_index]))
+                value = tablebase._get_value(*EndgameTablebase._get_signature_and_index(child_pieces, opponent))
+                if value is None:
+                    raise FileNotFoundError(f"Endgame table {EndgameTablebase._get_signature_and_index(child_pieces, opponent)[0]} is missing")
+                if value == EndgameTablebase.DRAW:
+                    external_draws[offset] = 1
+                elif (value - 1) % 2:
+                    external_wins[offset] = max(external_wins[offset], value - 1)
+                else:
+                    external_losses[offset] = min(external_losses[offset], value - 1)
+        return values, move_counts, external_losses, external_wins, external_draws
+
+    @staticmethod
+    def _solve(pieces, values, move_counts, external_losses, external_wins, external_draws):
+        # Retrograde analysis: positions are decided in the order of their distance. A position is won at distance
+        # d + 1 if a move leads to a loss at distance d, it is lost when all its moves lead to wins of the opponent,
+        # at the distance of the longest of them + 1. The undecided positions are draws.
+        buckets = {}
+        for index, value in enumerate(values):
+            if value == 1:
+                values[index] = 0
+                buckets.setdefault(0, array("I")).append(index)
+            elif value == EndgameTablebase.INVALID:
+                continue
+            if external_losses[index] != EndgameTablebase._NO_DISTANCE:
+                buckets.setdefault(external_losses[index] + 1, array("I")).append(index)
+            elif not move_counts[index] and external_wins[index] and not external_draws[index]:
+                buckets.setdefault(external_wins[index] + 1, array("I")).append(index)
+        while buckets:
+            distance = min(buckets)
+            if distance > EndgameTablebase.MAX_DISTANCE:
+                break
+            decided = []
+            for index in buckets.pop(distance):
+                # A position can be in a bucket more than once
+                if not values[index]:
+                    values[index] = distance + 1
+                    decided.append(index)
+            for index in decided:
+                for parent in EndgameTablebase._get_predecessors(pieces, index):
+                    if values[parent]:
+                        continue
+                    if distance % 2 == 0:
+                        buckets.setdefault(distance + 1, array("I")).append(parent)
+                        continue
+                    move_counts[parent] -= 1
+                    if (not move_counts[parent] and not external_draws[parent]
+                            and external_losses[parent] == EndgameTablebase._NO_DISTANCE):
+                        buckets.setdefault(max(distance, external_wins[parent]) + 1, array("I")).append(parent)
+
+    @staticmethod
+    def _get_predecessors(pieces, index):
+        # Indices of the positions from which a move that stays in the table leads to the position (moves taken back),
+        # valid or not
+        piece_count = len(pieces)
+        player_offset = 64 ** piece_count
+        player = index // player_offset
+        # The opponent of the player to move made the last move
+        mover = 1 - player
+        parent_base = index + (mover - player) * player_offset
+        squares = [(index >> (6 * piece_index)) & 63 for piece_index in range(piece_count)]
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        empty = occupied ^ constants.MAX_VALUE
+        for piece_index, (color, piece) in enumerate(pieces):
+            if color != mover:
+                continue
+            square = squares[piece_index]
+            if piece == constants.KING:
+                origins = AttackTables.KING_ATTACKS[square] & empty
+            elif piece == constants.KNIGHT:
+                origins = AttackTables.KNIGHT_ATTACKS[square] & empty
+            elif piece == constants.PAWN:
+                step = -8 if color == constants.WHITE else 8
+                origins = 0
+                if 0 <= square + step < 64 and empty & (1 << (square + step)):
+                    origins = 1 << (square + step)
+                    if 0 <= square + 2 * step < 64:
+                        origins |= empty & (1 << (square + 2 * step))
+            else:
+                origins = 0
+                if piece in (constants.ROOK, constants.QUEEN):
+                    origins |= AttackTables.ROOK_ATTACKS[square][occupied & AttackTables.ROOK_MASKS[square]]
+                if piece in (constants.BISHOP, constants.QUEEN):
+                    origins |= AttackTables.BISHOP_ATTACKS[square][occupied & AttackTables.BISHOP_MASKS[square]]
+                origins &= empty
+            while origins:
+                origin = (origins & -origins).bit_length() - 1
+                yield parent_base + ((origin - square) << (6 * piece_index))
+                origins &= origins - 1
+
+    @staticmethod
+    def _load_position(position, pieces, index):
+        # Sets up the position of the index, returns the squares of the pieces or None if two share a square
+        bitboards = [0] * 8
+        squares = []
+        for color, piece in pieces:
+            square = index & 63
+            index >>= 6
+            if bitboards[constants.WHITE] & (1 << square) or bitboards[constants.BLACK] & (1 << square):
+                return None
+            bitboards[color] |= 1 << square
+            bitboards[piece] |= 1 << square
+            squares.append(square)
+        position.bitboards = bitboards
+        position.mailbox = Position._build_mailbox(bitboards)
+        position.current_player = index
+        return squares
+
+    @staticmethod
+    def _is_valid(position):
+        if position.bitboards[constants.PAWN] & EndgameTablebase._PAWN_ROWS:
+            return False
+        if position.bitboards[constants.KING] & position.bitboards[position.current_player] & PositionStatus.HILL:
+            return False
+        return not ChessEngine.is_in_check(position, isOpponent=True)
+
+    @staticmethod
+    def _parse_signature(signature):
+        # "KQvK" -> [(colour, piece), ...] in signature order
+        sides = signature.upper().split("V")
+        if len(sides) != 2:
+            raise ValueError(f"Invalid material signature: {signature}")
+        pieces = []
+        for color, side in zip((constants.WHITE, constants.BLACK), sides):
+            if side.count("K") != 1 or any(letter not in EndgameTablebase.PIECES for letter in side):
+                raise ValueError(f"Invalid material signature: {signature}")
+            pieces += [(color, EndgameTablebase.PIECES[letter]) for letter in side]
+        # A table has 2 * 64 ** pieces entries, a fifth piece would need 2 GB and days to generate
+        if len(pieces) > EndgameTablebase.MAX_PIECES:
+            raise ValueError(f"Material signature {signature} has more than {EndgameTablebase.MAX_PIECES} pieces")
+        pieces.sort(key=lambda entry: (entry[0], EndgameTablebase.PIECE_RANKS[entry[1]]))
+        return pieces
+
+    @staticmethod
+    def _get_signature(pieces):
+        sides = ["", ""]
+        for entry in pieces:
+            sides[entry[0]] += EndgameTablebase.PIECE_LETTERS[entry[1]]
+        return "v".join(sides)
+
+    @staticmethod
+    def _get_signature_and_index(pieces, player):
+        # pieces: (colour, piece, square) in any order
+        pieces = sorted(pieces, key=lambda entry: (entry[0], EndgameTablebase.PIECE_RANKS[entry[1]]))
+        index = player
+        for _, _, square in reversed(pieces):
+            index = (index << 6) | square
+        return EndgameTablebase._get_signature(pieces), index
+
+    @staticmethod
+    def _get_successor_signatures(pieces):
+        # The tables reached by a capture or a conversion
+        signatures = set()
+        for piece_index, (color, piece) in enumerate(pieces):
+            if piece == constants.KING:
+                continue
+            signatures.add(EndgameTablebase._get_signature(pieces[:piece_index] + pieces[piece_index + 1:]))
+            if piece == constants.PAWN:
+                signatures.add(EndgameTablebase._get_signature(pieces[:piece_index] + [(color, constants.QUEEN)] + pieces[piece_index + 1:]))
+        return sorted(signatures, key=len)
+
+    @staticmethod
+    def _get_path(directory, signature):
+        return os.path.join(directory, signature + EndgameTablebase.FILE_EXTENSION)
+
+    @staticmethod
+    def _get_chunk_path(chunk_directory, start):
+        return os.path.join(chunk_directory, f"{start}.bin")
+
+    @staticmethod
+    def _write_file(path, data):
+        # Written under a temporary name and renamed, an interrupted write leaves no truncated file behind
+        with open(path + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate endgame tables or look up a position in them.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="generate the tables of material signatures like KQvK")
+    generate_parser.add_argument("directory", help="directory of the tables")
+    generate_parser.add_argument("signatures", nargs="+", help="material signatures, the white pieces, v, the black pieces")
+    generate_parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    probe_parser = subparsers.add_parser("probe", help="print the result of a position")
+    probe_parser.add_argument("directory", help="directory of the tables")
+    probe_parser.add_argument("fen")
+    arguments = parser.parse_args()
+
+    if arguments.command == "generate":
+        for material_signature in arguments.signatures:
+            try:
+                EndgameTablebase._parse_signature(material_signature)
+            except ValueError as error:
+                parser.error(str(error))
+        for material_signature in arguments.signatures:
+            print(f"{material_signature}: {EndgameTablebase.generate(arguments.directory, material_signature, arguments.processes)}", flush=True)
+    else:
+        tablebase = EndgameTablebase(arguments.directory)
+        board = Position()
+        board.load_from_fen(arguments.fen)
+        table_entry = tablebase.probe(board)
+        if table_entry is None:
+            print("Not in the tables")
+        elif table_entry[0] == constants.DRAW:
+            print("Draw")
+        else:
+            print(f"{constants.LABELS[table_entry[0]]} wins in {table_entry[1]} plies")
+        tablebase.close()
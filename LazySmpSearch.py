@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+from ParallelSearch import WorkerState
+from SearchController import SearchController
+from SharedTranspositionTable import SharedTranspositionTable
+
+# Stop flag shared by the workers, attached once by _initialize_worker() next to the WorkerState
+_worker_stop_memory = None
+
+
+def _initialize_worker(table_name, size_mb, stop_name):
+    global _worker_stop_memory
+    WorkerState.initialize(SharedTranspositionTable, size_mb, table_name)
+    _worker_stop_memory = shared_memory.SharedMemory(name=stop_name)
+
+
+def _search_position(position, max_depth, time_limit, with_cut_off, worker_index):
+    # Iterative deepening in a worker. Every second worker starts one depth deeper, so that the workers are spread
+    # over two depths and fill the shared table for each other. Returns (completed depth, move, nodes, variation).
+    board = WorkerState.board
+    board.load_compact_position(position)
+    search_controller = SearchController(time_limit, stop_flag=_worker_stop_memory.buf)
+    min_depth = min(max_depth, 1 + worker_index % 2)
+    move, nodes, variation = board.iterative_depth_search(max_depth, with_cut_off=with_cut_off, transposition_table=WorkerState.transposition_table,
+                                                          min_depth=min_depth, search_controller=search_controller)
+    return search_controller.completed_depth, move, nodes, variation
+
+
+class LazySmpSearch:
+    """
+    Lazy SMP: all worker processes search the same root with iterative deepening and share one transposition table.
+
+    The workers do not divide the tree among themselves. They only cooperate through the entries of the shared
+    SharedTranspositionTable, which let a worker skip the subtrees another one has already searched. The search ends
+    when the first worker completes max_depth (or the time is up); the move of the worker with the deepest completed
+    depth is returned, for equal depths the one of the lowest worker index.
+    """
+
+    def __init__(self, processes, tt_size_mb=16):
+        self.processes = processes
+        self.transposition_table = SharedTranspositionTable(tt_size_mb)
+        self._stop_memory = shared_memory.SharedMemory(create=True, size=1)
+        self._executor = ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker,
+                                             initargs=(self.transposition_table.name, tt_size_mb, self._stop_memory.name))
+
+    def close(self):
+        self._executor.shutdown()
+        self.transposition_table.close()
+        self.transposition_table.unlink()
+        self._stop_memory.close()
+        self._stop_memory.unlink()
+
+    def search(self, board, max_depth, time_limit=None, with_cut_off=True):
+        # Returns (best move, nodes of all workers, principal variation) like ChessBoard.iterative_depth_search()
+        position = board.get_compact_position()
+        self._stop_memory.buf[0] = 0
+        futures = [self._executor.submit(_search_position, position, max_depth, time_limit, with_cut_off, worker_index)
+                   for worker_index in range(self.processes)]
+        wait(futures, return_when=FIRST_COMPLETED)
+        # The other workers stop at their next check and return their last completed depth
+        self._stop_memory.buf[0] = 1
+        results = [future.result() for future in futures]
+        nodes = sum(result[2] for result in results)
+        _, best_move, _, principal_variation = max(results, key=lambda result: result[0])
+        return best_move, nodes, principal_variation
@@ -0,0 +1,83 @@
+from array import array
+import constants
+
+
+class MoveEncoding:
+    """
+    Moves packed into 16-bit integers: from index (bits 0-5), to index (bits 6-11), a capture flag and a promotion
+    flag. The squares are the bit indices of the bitboards (a1 = 0, h8 = 63).
+
+    An encoded move is a small int, so comparing moves and searching them in a buffer is a single int comparison
+    instead of a tuple comparison of two 64-bit ints. The helpers convert from and to the (from_square, to_square)
+    tuples of ChessEngine and the algebraic notation.
+    """
+
+    TO_SHIFT = 6
+    SQUARE_MASK = 0x3F
+    CAPTURE = 1 << 12
+    PROMOTION = 1 << 13
+    # Without castling and en passant no position has more legal moves
+    MAX_MOVES = 256
+
+    # Pawns are converted when they reach the first or the last row, see ChessEngine._convert_pawn()
+    _PROMOTION_SQUARES = (constants.NOT_TOP_EDGE & constants.NOT_BOTTOM_EDGE) ^ constants.MAX_VALUE
+
+    def __init__(self) -> None:
+        pass
+
+    @staticmethod
+    def encode(board, move):
+        # Encode a (from_square, to_square) move of the current position, the flags are taken from the board
+        from_square, to_square = move
+        encoded_move = (from_square.bit_length() - 1) | ((to_square.bit_length() - 1) << MoveEncoding.TO_SHIFT)
+        if (board.bitboards[constants.WHITE] | board.bitboards[constants.BLACK]) & to_square:
+            encoded_move |= MoveEncoding.CAPTURE
+        if board.bitboards[constants.PAWN] & from_square and to_square & MoveEncoding._PROMOTION_SQUARES:
+            encoded_move |= MoveEncoding.PROMOTION
+        return encoded_move
+
+    @staticmethod
+    def to_tuple(encoded_move):
+        return 1 << (encoded_move & MoveEncoding.SQUARE_MASK), 1 << ((encoded_move >> MoveEncoding.TO_SHIFT) & MoveEncoding.SQUARE_MASK)
+
+    @staticmethod
+    def from_algebraic(board, algebraic_move):
+        # "e2e4" -> encoded move of the current position
+        from_index = MoveEncoding._algebraic_field_to_index(algebraic_move[:2])
+        to_index = MoveEncoding._algebraic_field_to_index(algebraic_move[2:4])
+        return MoveEncoding.encode(board, (1 << from_index, 1 << to_index))
+
+    @staticmethod
+    def to_algebraic(encoded_move):
+        return (MoveEncoding._index_to_algebraic_field(encoded_move & MoveEncoding.SQUARE_MASK)
+                + MoveEncoding._index_to_algebraic_field((encoded_move >> MoveEncoding.TO_SHIFT) & MoveEncoding.SQUARE_MASK))
+
+    @staticmethod
+    def is_capture(encoded_move):
+        return bool(encoded_move & MoveEncoding.CAPTURE)
+
+    @staticmethod
+    def is_promotion(encoded_move):
+        return bool(encoded_move & MoveEncoding.PROMOTION)
+
+    @staticmethod
+    def _algebraic_field_to_index(field):
+        return (int(field[1]) - 1) * 8 + ord(field[0]) - ord("a")
+
+    @staticmethod
+    def _index_to_algebraic_field(index):
+        return chr(ord("a") + index % 8) + str(index // 8 + 1)
+
+
+class MoveBuffers:
+    """
+    One preallocated array of MoveEncoding.MAX_MOVES unsigned 16-bit moves per ply. The move generator writes into
+    the buffer of its ply (see ChessEngine.generate_encoded_legal_moves()) and returns the number of moves, so a
+    search or perft allocates no move lists. A buffer is overwritten by the next generation at the same ply.
+    """
+
+    def __init__(self, max_ply):
+        self.buffers = [array("H", bytes(2 * MoveEncoding.MAX_MOVES)) for _ in range(max_ply + 1)]
+
+    def __getitem__(self, ply):
+        return self.buffers[ply]
@@ -0,0 +1,89 @@
+import constants
+from MoveEncoding import MoveEncoding
+from PieceSquareTables import PIECE_VALUES
+
+
+class MoveOrderer:
+    """
+    Sorts the legal moves of a node so that the moves most likely to cause a cut-off are searched first.
+
+    The order is: the best move from the transposition table, captures and promotions by MVV-LVA (most valuable
+    victim, least valuable attacker), the two killer moves of the ply (quiet moves that caused a cut-off in a sibling
+    node), and the remaining quiet moves by their history score. One instance is used for a whole iterative deepening
+    search, so the killers and the history of the lower depths help the ordering of the deeper ones. The moves are
+    MoveEncoding integers: captures and promotions are recognised by their flags and the pieces are read from the
+    mailbox.
+    """
+
+    TACTICAL = MoveEncoding.CAPTURE | MoveEncoding.PROMOTION
+    # From and to index of an encoded move
+    SQUARES_MASK = (1 << (2 * MoveEncoding.TO_SHIFT)) - 1
+
+    TT_MOVE_SCORE = 1 << 30
+    CAPTURE_SCORE = 1 << 28
+    FIRST_KILLER_SCORE = 1 << 27
+    SECOND_KILLER_SCORE = FIRST_KILLER_SCORE - 1
+    # History scores are halved when they reach this limit, so that they stay below the killer scores
+    HISTORY_LIMIT = 1 << 26
+
+    def __init__(self, max_ply):
+        # Killers are kept for the plies 0 to max_ply, the deepest ply of the search (ChessBoard.MAX_SEARCH_PLY)
+        self.max_ply = max_ply
+        self.killers = [[None, None] for _ in range(max_ply + 1)]
+        # history[color][from_index + to_index * 64]
+        self.history = [[0] * (64 * 64) for _ in (constants.WHITE, constants.BLACK)]
+
+    def order_moves(self, board, legal_moves, ply=0, tt_move=None):
+        # Returns the moves sorted by descending score, moves with equal score keep the generation order
+        if len(legal_moves) < 2:
+            return legal_moves
+        killers = self.killers[ply] if ply <= self.max_ply else (None, None)
+        history = self.history[board.current_player]
+        scores = {}
+        for move in legal_moves:
+            if move == tt_move:
+                scores[move] = MoveOrderer.TT_MOVE_SCORE
+            elif move & MoveOrderer.TACTICAL:
+                scores[move] = MoveOrderer.CAPTURE_SCORE + MoveOrderer.mvv_lva(board, move)
+            elif move == killers[0]:
+                scores[move] = MoveOrderer.FIRST_KILLER_SCORE
+            elif move == killers[1]:
+                scores[move] = MoveOrderer.SECOND_KILLER_SCORE
+            else:
+                scores[move] = history[move & MoveOrderer.SQUARES_MASK]
+        return sorted(legal_moves, key=scores.__getitem__, reverse=True)
+
+    def record_cut_off(self, board, move, depth_left, ply):
+        # Called after the move was taken back. Captures are not recorded, they are already ordered by MVV-LVA.
+        if move & MoveEncoding.CAPTURE:
+            return
+        if ply <= self.max_ply:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        history = self.history[board.current_player]
+        index = move & MoveOrderer.SQUARES_MASK
+        history[index] += depth_left * depth_left
+        if history[index] >= MoveOrderer.HISTORY_LIMIT:
+            for color_history in self.history:
+                for i in range(len(color_history)):
+                    color_history[i] //= 2
+
+    def is_killer(self, move, ply):
+        return ply <= self.max_ply and move in self.killers[ply]
+
+    @staticmethod
+    def mvv_lva(board, move):
+        # Higher for more valuable victims, among equal victims higher for less valuable attackers
+        attacker = board.mailbox[move & MoveEncoding.SQUARE_MASK] >> 1
+        return MoveOrderer.capture_gain(board, move) * 100 - PIECE_VALUES[attacker]
+
+    @staticmethod
+    def capture_gain(board, move):
+        # Material won by a capture or promotion in pawns, without the pieces lost afterwards
+        victim_code = board.mailbox[(move >> MoveEncoding.TO_SHIFT) & MoveEncoding.SQUARE_MASK]
+        gain = PIECE_VALUES[victim_code >> 1] if victim_code else 0
+        if move & MoveEncoding.PROMOTION:
+            gain += PIECE_VALUES[constants.QUEEN] - PIECE_VALUES[constants.PAWN]
+        return gain
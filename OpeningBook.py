@@ -0,0 +1,155 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+from ChessEngine import ChessEngine
+from MoveEncoding import MoveEncoding
+from Position import Position
+
+
+class OpeningBook:
+    """
+    Opening book in the style of Polyglot: a binary file of (position key, move, weight) records sorted by key.
+
+    A record is 12 bytes, big-endian: the Zobrist key of the position (see ZobristHash, the keys are the same in
+    every process and run), the move as MoveEncoding and the weight. The file is memory-mapped and searched with a
+    binary search, so opening a book costs nothing and only the pages of the looked up keys are read. The book moves
+    are checked against the legal moves, a key collision can not produce an illegal move.
+
+    build() writes a book from (key, move, weight) entries, build_from_games() from recorded games and
+    build_from_analysis() from the JSON lines of PositionAnalyser.
+    """
+
+    RECORD = struct.Struct(">QHH")
+    MAX_WEIGHT = 0xFFFF
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self.record_count = size // OpeningBook.RECORD.size
+        # An empty file can not be mapped
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def get_moves(self, board):
+        # Legal book moves of the position with their weights, highest weight first
+        entries = []
+        legal_moves = None
+        index = self._find_first(board.hash_key)
+        while index < self.record_count:
+            key, encoded_move, weight = OpeningBook.RECORD.unpack_from(self._mmap, index * OpeningBook.RECORD.size)
+            if key != board.hash_key:
+                break
+            if legal_moves is None:
+                legal_moves = ChessEngine.generate_legal_moves(board)
+            move = MoveEncoding.to_tuple(encoded_move)
+            if move in legal_moves and weight:
+                entries.append((move, weight))
+            index += 1
+        entries.sort(key=lambda entry: entry[1], reverse=True)
+        return entries
+
+    def choose_move(self, board, random_generator=None):
+        # A book move chosen with probability proportional to its weight, the heaviest without random_generator,
+        # None if the position is not in the book
+        entries = self.get_moves(board)
+        if not entries:
+            return None
+        if random_generator is None:
+            return entries[0][0]
+        moves, weights = zip(*entries)
+        return random_generator.choices(moves, weights)[0]
+
+    def _find_first(self, key):
+        # Index of the first record with a key not lower than key
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            if OpeningBook.RECORD.unpack_from(self._mmap, middle * OpeningBook.RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def build(path, entries):
+        # Writes a book from (position key, encoded move, weight) entries, the weights of equal position and move are
+        # added up and capped at MAX_WEIGHT. Returns the number of records.
+        weights = {}
+        for key, encoded_move, weight in entries:
+            weights[key, encoded_move] = weights.get((key, encoded_move), 0) + weight
+        records = sorted(((key, encoded_move, min(weight, OpeningBook.MAX_WEIGHT)) for (key, encoded_move), weight in weights.items()
+                          if weight > 0), key=lambda record: (record[0], -record[2], record[1]))
+        with open(path, "wb") as file:
+            for record in records:
+                file.write(OpeningBook.RECORD.pack(*record))
+        return len(records)
+
+    @staticmethod
+    def build_from_games(path, games, max_ply=20):
+        # games: move lists in algebraic notation from the start position (e.g. recorded self-play). Every move of the
+        # first max_ply plies counts once for the position it was played in.
+        return OpeningBook.build(path, OpeningBook._get_game_entries(games, max_ply))
+
+    @staticmethod
+    def build_from_analysis(path, lines):
+        # lines: JSON lines of PositionAnalyser, every analysed best move counts once for its position
+        return OpeningBook.build(path, OpeningBook._get_analysis_entries(lines))
+
+    @staticmethod
+    def _get_game_entries(games, max_ply):
+        for game in games:
+            position = Position()
+            for algebraic_move in list(game)[:max_ply]:
+                move = ChessEngine.algebraic_move_to_binary(algebraic_move)
+                if move not in ChessEngine.generate_legal_moves(position):
+                    break
+                yield position.hash_key, MoveEncoding.encode(position, move), 1
+                position.make_move(move)
+
+    @staticmethod
+    def _get_analysis_entries(lines):
+        position = Position()
+        for line in lines:
+            result = json.loads(line)
+            if result.get("best_move") is None:
+                continue
+            position.load_from_fen(" ".join(result["fen"].split()[:4]))
+            yield position.hash_key, MoveEncoding.from_algebraic(position, result["best_move"]), 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an opening book or look up a position in it.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="build a book from games and analysis results")
+    build_parser.add_argument("book", help="book file to write")
+    build_parser.add_argument("--games", help="file with one game per line, moves in algebraic notation separated by spaces")
+    build_parser.add_argument("--analysis", help="JSON lines written by PositionAnalyser.py")
+    build_parser.add_argument("--max-ply", type=int, default=20, help="plies of every game that go into the book")
+    probe_parser = subparsers.add_parser("probe", help="print the book moves of a position")
+    probe_parser.add_argument("book", help="book file")
+    probe_parser.add_argument("fen", nargs="?", default="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    arguments = parser.parse_args()
+
+    if arguments.command == "build":
+        entries = []
+        if arguments.games:
+            with open(arguments.games) as games_file:
+                entries += OpeningBook._get_game_entries((line.split() for line in games_file if line.strip()), arguments.max_ply)
+        if arguments.analysis:
+            with open(arguments.analysis) as analysis_file:
+                entries += OpeningBook._get_analysis_entries(line for line in analysis_file if line.strip())
+        print(f"{OpeningBook.build(arguments.book, entries)} records written to {arguments.book}")
+    else:
+        book = OpeningBook(arguments.book)
+        board = Position()
+        board.load_from_fen(arguments.fen)
+        for book_move, book_weight in book.get_moves(board):
+            print(ChessEngine.binary_move_to_algebraic(book_move[0], book_move[1]), book_weight)
+        book.close()
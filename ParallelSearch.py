@@ -0,0 +1,120 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+from ChessBoard import ChessBoard
+from MoveOrderer import MoveOrderer
+from PositionStatus import PositionStatus
+from SearchController import SearchController
+from SearchTimeoutException import SearchTimeoutException
+from TranspositionTable import TranspositionTable
+
+class WorkerState:
+    """
+    The board and the transposition table of a search worker process, created once by initialize() and kept warm
+    between the tasks. initialize() is the process pool initializer of ParallelSearch, LazySmpSearch and
+    PositionAnalyser; the table class and its arguments are passed, so that each can use its own table.
+    """
+
+    board = None
+    transposition_table = None
+
+    @staticmethod
+    def initialize(table_class, *table_arguments):
+        # Creating the board imports and builds the attack and piece-square tables before the first task arrives
+        WorkerState.board = ChessBoard()
+        WorkerState.transposition_table = table_class(*table_arguments)
+
+
+# Killers and history of the root position searched last by this worker, see _search_root_move()
+_worker_move_orderer = None
+_worker_root_key = None
+
+
+def _search_root_move(position, move, move_number, reduction, depth, alpha, with_cut_off, time_limit):
+    # Searches one root move of the position in a worker like ChessBoard.negamax() does at the root with the window
+    # (alpha, infinity). Returns (score, nodes, principal variation) from the view of the player to move at the root,
+    # the score is at most alpha if the move is not better, or None if the time ran out.
+    global _worker_move_orderer, _worker_root_key
+    board = WorkerState.board
+    board.load_compact_position(position)
+    if board.hash_key != _worker_root_key:
+        # New position: the killers and history of the old one do not help, the table entries may
+        _worker_root_key = board.hash_key
+        _worker_move_orderer = MoveOrderer(ChessBoard.MAX_SEARCH_PLY)
+        WorkerState.transposition_table.new_search()
+    table = WorkerState.transposition_table if with_cut_off else None
+    search_controller = SearchController(time_limit)
+    board.make_move(move)
+    try:
+        score, nodes, variation = board._search_made_move(move_number, reduction, alpha, math.inf, depth, 0, with_cut_off, table, 0,
+                                                          search_controller, _worker_move_orderer)
+        return score, nodes, [move] + variation
+    except SearchTimeoutException:
+        return None
+    finally:
+        while board.move_stack:
+            board.unmake_move()
+
+
+class ParallelSearch:
+    """
+    Root-split search of one depth in a pool of worker processes.
+
+    The first (principal variation) move is searched alone to get an alpha bound. The other root moves are then
+    searched in rounds of one move per worker, each round with the best score of the rounds before as alpha, so a
+    move only has to be searched exactly if it is better. The workers keep their board, transposition table and move
+    orderer between the searches and receive only the compact position (see Position.get_compact_position()).
+
+    Every root move is searched exactly as by the serial negamax() with the same alpha. Without cut-offs the result
+    is the same as the serial search; with them the tables and move histories of the workers differ from the serial
+    ones, so the pruning deeper in the tree can differ and with it, rarely, the best move.
+    """
+
+    def __init__(self, processes, tt_size_mb=16):
+        self.processes = processes
+        self._executor = ProcessPoolExecutor(max_workers=processes, initializer=WorkerState.initialize,
+                                             initargs=(TranspositionTable, tt_size_mb))
+
+    def close(self):
+        self._executor.shutdown()
+
+    def search_depth(self, board, depth, principal_variation, with_cut_off, counter, search_controller, move_orderer=None):
+        # Same result as board.negamax() at the root: (score, counter, principal variation). The root moves searched
+        # completely are reported to the search controller, SearchTimeoutException is raised if the time runs out.
+        status = PositionStatus(board, board.move_buffers[0])
+        if status.result is not None:
+            return board.evaluate_board(status=status), counter + 1, []
+        previous_best_move = principal_variation[0] if principal_variation else None
+        legal_moves = status.legal_moves
+        if move_orderer is not None:
+            legal_moves = move_orderer.order_moves(board, legal_moves, 0, previous_best_move)
+        else:
+            legal_moves = ChessBoard._order_tt_move_first(legal_moves, previous_best_move)
+        position = board.get_compact_position()
+        in_check = status.in_check
+        reductions = [board._get_late_move_reduction(move, move_number, depth, 0, in_check, with_cut_off, move_orderer)
+                      for move_number, move in enumerate(legal_moves)]
+        alpha = -math.inf
+        best_variation = []
+        rounds = [[0]] + [list(range(i, min(i + self.processes, len(legal_moves)))) for i in range(1, len(legal_moves), self.processes)]
+        for move_numbers in rounds:
+            time_limit = search_controller.remaining_time()
+            if time_limit is not None and time_limit <= 0:
+                raise SearchTimeoutException()
+            round_moves = [legal_moves[move_number] for move_number in move_numbers]
+            futures = [self._executor.submit(_search_root_move, position, legal_moves[move_number], move_number, reductions[move_number], depth,
+                                             alpha, with_cut_off, time_limit) for move_number in move_numbers]
+            results = [future.result() for future in futures]
+            for move, result in zip(round_moves, results):
+                if result is None:
+                    search_controller.timed_out = True
+                    raise SearchTimeoutException()
+                score, nodes, variation = result
+                counter += nodes
+                search_controller.nodes += nodes
+                search_controller.report_root_move(move, score)
+            # Moves are taken in the serial order, a later move has to be strictly better
+            for move, (score, _, variation) in zip(round_moves, results):
+                if score > alpha:
+                    alpha = score
+                    best_variation = variation
+        return alpha, counter + 1, best_variation
@@ -0,0 +1,101 @@
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ChessEngine import ChessEngine
+from MoveEncoding import MoveBuffers
+from Position import Position
+
+
+class Perft:
+    """
+    Counts the leaf nodes of the legal move tree to a fixed depth (perft) to verify and time the move generator.
+
+    The expected counts of SUITE follow the rules of this project: no castling, no en passant, pawns may move two
+    squares from every rank and promote to a queen only. They were cross-checked with the slower
+    generate_moves() + filter_illegal_moves() path. Reaching the hill does not end the tree, perft only counts moves.
+    """
+
+    # (name, fen, {depth: expected node count})
+    SUITE = [
+        ("start position", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", {1: 20, 2: 400, 3: 9194, 4: 209691}),
+        ("kiwipete without castling", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w - - 0 1", {1: 46, 2: 1906, 3: 88565, 4: 3638581}),
+        ("pins and checks", "r2qr1k1/p4ppp/2Q1b3/4N3/5B2/3BnP2/PP4PP/R4RK1 w - - 0 19", {1: 57, 2: 2433, 3: 133323, 4: 5538182}),
+        ("endgame", "8/8/4kpp1/3p4/p6P/2B4b/6P1/6K1 w - - 1 48", {1: 18, 2: 284, 3: 4750, 4: 76634}),
+        ("promotions", "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1", {1: 15, 2: 210, 3: 3253, 4: 47828}),
+    ]
+
+    def __init__(self) -> None:
+        pass
+
+    @staticmethod
+    def perft(board, depth, move_buffers=None, ply=0):
+        # The moves of every ply are generated into a preallocated buffer of move_buffers as encoded moves
+        if depth == 0:
+            return 1
+        if move_buffers is None:
+            move_buffers = MoveBuffers(depth)
+        buffer = move_buffers[ply]
+        count = ChessEngine.generate_encoded_legal_moves(board, buffer)
+        if depth == 1:
+            return count
+        nodes = 0
+        for i in range(count):
+            board.make_move(buffer[i])
+            nodes += Perft.perft(board, depth - 1, move_buffers, ply + 1)
+            board.unmake_move()
+        return nodes
+
+    @staticmethod
+    def divide(board, depth, processes=None):
+        # Node count below every root move, keyed by the move in algebraic notation. With processes the root moves
+        # are counted in a process pool.
+        legal_moves = ChessEngine.generate_legal_moves(board)
+        if processes is None or processes <= 1:
+            counts = []
+            for move in legal_moves:
+                board.make_move(move)
+                counts.append(Perft.perft(board, depth - 1))
+                board.unmake_move()
+        else:
+            position = board.get_compact_position()
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                counts = list(executor.map(Perft._perft_after_move, [position] * len(legal_moves), legal_moves,
+                                           [depth - 1] * len(legal_moves)))
+        return {ChessEngine.binary_move_to_algebraic(move[0], move[1]): count for move, count in zip(legal_moves, counts)}
+
+    @staticmethod
+    def run_suite(max_depth=4, processes=None, print_results=True):
+        # Runs all positions of SUITE up to max_depth, returns True if every count is as expected
+        all_passed = True
+        for name, fen, expected_counts in Perft.SUITE:
+            for depth in sorted(expected_counts):
+                if depth > max_depth:
+                    continue
+                board = Position()
+                board.load_from_fen(fen)
+                start_time = time.time()
+                if processes is None or processes <= 1:
+                    nodes = Perft.perft(board, depth)
+                else:
+                    nodes = sum(Perft.divide(board, depth, processes).values())
+                elapsed_time = time.time() - start_time
+                passed = nodes == expected_counts[depth]
+                all_passed = all_passed and passed
+                if print_results:
+                    nodes_per_second = round(nodes / elapsed_time) if elapsed_time > 0 else 0
+                    print(f"{'ok  ' if passed else 'FAIL'} {name}, depth {depth}: {nodes} nodes (expected {expected_counts[depth]}), "
+                          f"{elapsed_time:.3f} seconds, {nodes_per_second} nodes/second")
+        return all_passed
+
+    @staticmethod
+    def _perft_after_move(position, move, depth):
+        # Runs in a worker process on a copy of the position, perft needs no evaluation or search state
+        position.make_move(move)
+        return Perft.perft(position, depth)
+
+
+if __name__ == "__main__":
+    # python Perft.py [max_depth] [processes]
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    sys.exit(0 if Perft.run_suite(max_depth, processes) else 1)
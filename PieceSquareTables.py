@@ -0,0 +1,51 @@
+import constants
+
+# Piece-square tables for the incremental part of ChessBoard.evaluate_board(), indexed by square index (0 = a1).
+# All values are integers in units of 1/SCALE pawns, so that the running sums kept by make/unmake are exact.
+
+SCALE = 840
+
+PIECE_VALUES = {
+    constants.PAWN: 1, constants.KNIGHT: 3, constants.BISHOP: 3, constants.ROOK: 5, constants.QUEEN: 9, constants.KING: 20
+}
+
+CENTER_MASK = int("0b0000000000000000001111000011110000111100001111000000000000000000", 2)
+
+
+def _center_distance(index):
+    row, col = divmod(index, constants.BOARD_SIZE)
+    return abs(row - 3.5) + abs(col - 3.5)
+
+
+# HILL[index]: bonus for the king's position near the center (the hill), part of the king's table
+HILL = [round(10 * SCALE / (_center_distance(index) + 1)) for index in range(64)]
+
+
+def _build_tables():
+    tables = [None] * (constants.KING + 1)
+    for piece in range(constants.PAWN, constants.KING + 1):
+        table = [PIECE_VALUES[piece] * SCALE] * 64
+        for index in range(64):
+            # Bonus points for controlling the center
+            if CENTER_MASK & (1 << index):
+                table[index] += round(0.5 * SCALE / (_center_distance(index) + 1))
+            if piece == constants.KING:
+                table[index] += HILL[index]
+        tables[piece] = table
+    return tables
+
+
+# PST[piece][index]: material and positional value of a piece on a square, the same for both colours
+PST = _build_tables()
+
+
+def compute(board):
+    # Sums of the table values of the white and the black pieces, computed from scratch
+    scores = [0, 0]
+    for color in (constants.WHITE, constants.BLACK):
+        for piece in range(constants.PAWN, constants.KING + 1):
+            pieces = board.bitboards[color] & board.bitboards[piece]
+            while pieces:
+                scores[color] += PST[piece][(pieces & -pieces).bit_length() - 1]
+                pieces &= pieces - 1
+    return scores
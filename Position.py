@@ -0,0 +1,228 @@
+from loguru import logger
+from ChessEngine import ChessEngine
+from ChessPrintService import ChessPrintService
+from ZobristHash import ZobristHash
+import PieceSquareTables
+import constants
+
+
+class Position:
+    """
+    The state of a position that the move generator and the search work on: the bitboards, the player to move, the
+    counter for the 50 moves rule, the position key, the piece-square sums and what make_move() needs to take moves
+    back and detect repetitions.
+
+    Next to the bitboards a mailbox holds the piece on every square as piece << 1 | colour (0 for an empty square),
+    so the piece on a square is one list lookup. ChessEngine.perform_move(), _convert_pawn() and unmake_move() keep
+    it in sync with the bitboards; verify_mailbox() checks that they agree.
+
+    The attributes are slots, so a Position has no instance dictionary and copy() only copies the eight bitboards,
+    the two sums and the repetition counts. ChessBoard extends it with the evaluation, the search and their caches.
+    """
+
+    __slots__ = ("bitboards", "mailbox", "current_player", "pawn_not_moved_counter", "hash_key", "pst_score", "position_counts",
+                 "move_stack", "game_result")
+
+    def __init__(self):
+        self.current_player = constants.WHITE
+        self.initialize_bitboards()
+        self.game_result = None
+        # Number of times each position key was reached by a move, for draw by repetition
+        self.position_counts = {}
+        self.move_stack = []
+        self.pawn_not_moved_counter = 0
+
+    def initialize_bitboards(self):
+        self.bitboards = [0] * 8
+
+        # Set initial positions for constants.WHITE, black and all pieces using binary literals
+        self.bitboards[constants.WHITE] = int("0b0000000000000000000000000000000000000000000000001111111111111111", 2)
+        self.bitboards[constants.BLACK] = int("0b1111111111111111000000000000000000000000000000000000000000000000", 2)
+        self.bitboards[constants.PAWN] = int("0b0000000011111111000000000000000000000000000000001111111100000000", 2)
+        self.bitboards[constants.KNIGHT] = int("0b0100001000000000000000000000000000000000000000000000000001000010", 2)
+        self.bitboards[constants.BISHOP] = int("0b0010010000000000000000000000000000000000000000000000000000100100", 2)
+        self.bitboards[constants.ROOK] = int("0b1000000100000000000000000000000000000000000000000000000010000001", 2)
+        self.bitboards[constants.QUEEN] = int("0b0000100000000000000000000000000000000000000000000000000000001000", 2)
+        self.bitboards[constants.KING] = int("0b0001000000000000000000000000000000000000000000000000000000010000", 2)
+        self.mailbox = Position._build_mailbox(self.bitboards)
+        self.hash_key = ZobristHash.compute(self)
+        self.pst_score = PieceSquareTables.compute(self)
+
+    def load_from_fen(self, fen):
+        fen_parts = fen.split(" ")
+        piece_positions = fen_parts[0]
+        current_player_fen = fen_parts[1]
+
+        self.current_player = constants.WHITE if current_player_fen == "w" else constants.BLACK
+
+        rows = piece_positions.split("/")
+
+        self.bitboards = [0] * 8
+        self.move_stack = []
+        self.position_counts = {}
+        self.pawn_not_moved_counter = 0
+        self.game_result = None
+
+        piece_symbols = {
+            "P": constants.PAWN,
+            "N": constants.KNIGHT,
+            "B": constants.BISHOP,
+            "R": constants.ROOK,
+            "Q": constants.QUEEN,
+            "K": constants.KING,
+        }
+
+        # Process rows in reverse order
+        for row_index, row in enumerate(reversed(rows)):
+            col_index = 0
+            for char in row:
+                if char.isdigit():
+                    col_index += int(char)
+                else:
+                    color = constants.WHITE if char.isupper() else constants.BLACK
+                    piece_type = piece_symbols[char.upper()]
+
+                    square = 1 << (row_index * 8 + col_index)
+
+                    self.bitboards[color] |= square
+                    self.bitboards[piece_type] |= square
+
+                    col_index += 1
+        self.mailbox = Position._build_mailbox(self.bitboards)
+        self.hash_key = ZobristHash.compute(self)
+        self.pst_score = PieceSquareTables.compute(self)
+
+    def _get_piece_at_square(self, square):
+        code = self.mailbox[square.bit_length() - 1]
+        if code:
+            return code >> 1
+        service = ChessPrintService()
+        logger.error("Error in method _get_piece_at_square(). No figure is on the input square: {}. \n Given the board: {}", ChessEngine.binary_field_to_algebraic(square), service.print_board(self.bitboards))
+
+    @staticmethod
+    def _build_mailbox(bitboards):
+        mailbox = [0] * 64
+        for color in (constants.WHITE, constants.BLACK):
+            for piece in range(constants.PAWN, constants.KING + 1):
+                pieces = bitboards[color] & bitboards[piece]
+                while pieces:
+                    mailbox[(pieces & -pieces).bit_length() - 1] = (piece << 1) | color
+                    pieces &= pieces - 1
+        return mailbox
+
+    def verify_mailbox(self):
+        # Debug check that the mailbox and the bitboards describe the same pieces, every difference is logged
+        consistent = True
+        expected_mailbox = Position._build_mailbox(self.bitboards)
+        for index in range(64):
+            if self.mailbox[index] != expected_mailbox[index]:
+                consistent = False
+                logger.error("Mailbox and bitboards differ on {}: {} in the mailbox, {} in the bitboards", ChessEngine.binary_field_to_algebraic(1 << index),
+                             self.mailbox[index], expected_mailbox[index])
+        # A square in two colour or two piece bitboards is lost by _build_mailbox()
+        if self.bitboards[constants.WHITE] & self.bitboards[constants.BLACK]:
+            consistent = False
+            logger.error("Squares in both colour bitboards: {}", self.bitboards[constants.WHITE] & self.bitboards[constants.BLACK])
+        pieces = 0
+        for piece in range(constants.PAWN, constants.KING + 1):
+            if pieces & self.bitboards[piece]:
+                consistent = False
+                logger.error("Squares in more than one piece bitboard: {}", pieces & self.bitboards[piece])
+            pieces |= self.bitboards[piece]
+        if pieces != self.bitboards[constants.WHITE] | self.bitboards[constants.BLACK]:
+            consistent = False
+            logger.error("Piece and colour bitboards differ: {}", pieces ^ (self.bitboards[constants.WHITE] | self.bitboards[constants.BLACK]))
+        return consistent
+
+    def make_move(self, move):
+        # Perform a (from_square, to_square) move or a MoveEncoding integer in place; it can be taken back with
+        # unmake_move()
+        ChessEngine.perform_move(move, self, move_type="encoded" if move.__class__ is int else "binary", with_validation=False)
+
+    def copy(self, repeated_only=False):
+        # A new Position with the same pieces, player, counters and key. Its move stack is empty, the moves that led
+        # here can not be taken back on the copy. With repeated_only only the position counts that would make a draw
+        # when reached again are copied, which is all a search needs.
+        position = Position.__new__(Position)
+        position.bitboards = list(self.bitboards)
+        position.mailbox = list(self.mailbox)
+        position.current_player = self.current_player
+        position.pawn_not_moved_counter = self.pawn_not_moved_counter
+        position.hash_key = self.hash_key
+        position.pst_score = list(self.pst_score)
+        if repeated_only:
+            position.position_counts = {key: count for key, count in self.position_counts.items() if count >= 2}
+        else:
+            position.position_counts = dict(self.position_counts)
+        position.move_stack = []
+        position.game_result = None
+        return position
+
+    def get_compact_position(self):
+        # Everything a search of this position needs, for other processes: bitboards, player to move, the counter for
+        # the 50 moves rule and the positions that would be a draw by repetition when reached again
+        return self.copy(repeated_only=True)
+
+    def load_compact_position(self, position):
+        # Takes over a position of get_compact_position(), e.g. from another process
+        self.bitboards = list(position.bitboards)
+        self.mailbox = list(position.mailbox)
+        self.current_player = position.current_player
+        self.pawn_not_moved_counter = position.pawn_not_moved_counter
+        self.hash_key = position.hash_key
+        self.pst_score = list(position.pst_score)
+        self.position_counts = dict(position.position_counts)
+        self.move_stack = []
+        self.game_result = None
+
+    def make_null_move(self):
+        # Pass the right to move to the opponent, used by the null move pruning of the search. The undo record has no
+        # squares and the position is not counted for draw by repetition.
+        self.move_stack.append((None, None, None, None, self.current_player, self.pawn_not_moved_counter, False, self.hash_key))
+        self.current_player = Position.get_opponent(self.current_player)
+        self.hash_key ^= ZobristHash.BLACK_TO_MOVE_KEY
+
+    def unmake_move(self):
+        # Take back the last move using the undo record written by ChessEngine.perform_move() or make_null_move()
+        from_square, to_square, moved_piece, captured_piece, previous_player, previous_pawn_not_moved_counter, promoted, previous_hash_key = self.move_stack.pop()
+        if from_square is None:
+            self.current_player = previous_player
+            self.hash_key = previous_hash_key
+            return
+        # Forget the position reached by the move
+        count = self.position_counts[self.hash_key] - 1
+        if count:
+            self.position_counts[self.hash_key] = count
+        else:
+            del self.position_counts[self.hash_key]
+        color = constants.WHITE if self.bitboards[constants.WHITE] & to_square else constants.BLACK
+
+        # Take back the piece-square values
+        from_index = from_square.bit_length() - 1
+        to_index = to_square.bit_length() - 1
+        if promoted:
+            self.pst_score[color] -= PieceSquareTables.PST[constants.QUEEN][to_index] - PieceSquareTables.PST[constants.PAWN][to_index]
+        if moved_piece is not None:
+            self.pst_score[color] -= PieceSquareTables.PST[moved_piece][to_index] - PieceSquareTables.PST[moved_piece][from_index]
+        if captured_piece is not None:
+            self.pst_score[Position.get_opponent(color)] += PieceSquareTables.PST[captured_piece][to_index]
+
+        # Move the piece back to its original position (as a pawn again if it was converted)
+        self.mailbox[from_index] = (moved_piece << 1) | color
+        self.mailbox[to_index] = (captured_piece << 1) | Position.get_opponent(color) if captured_piece is not None else 0
+        self.bitboards[constants.QUEEN if promoted else moved_piece] &= ~to_square
+        self.bitboards[moved_piece] |= from_square
+        self.bitboards[color] = (self.bitboards[color] & ~to_square) | from_square
+
+        # Put a captured piece back on the destination
+        if captured_piece is not None:
+            self.bitboards[captured_piece] |= to_square
+            self.bitboards[Position.get_opponent(color)] |= to_square
+
+        self.current_player = previous_player
+        self.pawn_not_moved_counter = previous_pawn_not_moved_counter
+        self.hash_key = previous_hash_key
+
+    @staticmethod
+    def get_opponent(player):
+        return constants.WHITE if player == constants.BLACK else constants.BLACK
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ChessBoard import ChessBoard
+from ChessEngine import ChessEngine
+from ParallelSearch import WorkerState
+from SearchController import SearchController
+from TranspositionTable import TranspositionTable
+
+def _analyse_position(fen, depth, time_limit):
+    board = WorkerState.board
+    board.load_from_fen(fen)
+    search_controller = SearchController(time_limit)
+    start_time = time.perf_counter()
+    move, nodes, principal_variation = board.iterative_depth_search(depth, transposition_table=WorkerState.transposition_table,
+                                                                    search_controller=search_controller)
+    return {
+        "best_move": ChessEngine.binary_move_to_algebraic(move[0], move[1]) if move is not None else None,
+        "score": search_controller.best_score,
+        "depth": search_controller.completed_depth,
+        "nodes": nodes,
+        "time": round(time.perf_counter() - start_time, 6),
+        "pv": [ChessEngine.binary_move_to_algebraic(pv_move[0], pv_move[1]) for pv_move in principal_variation],
+    }
+
+
+class PositionAnalyser:
+    """
+    Analyses many positions in a pool of worker processes that is started once and kept for all calls.
+
+    Every worker keeps its board and transposition table. The positions are deduplicated by position key (the same
+    pieces and player to move give the same result) and at most MAX_PENDING_PER_PROCESS positions per worker are in
+    flight, so input files of any size are streamed. The results come back in input order.
+    """
+
+    MAX_PENDING_PER_PROCESS = 4
+    DEFAULT_LIMITS = {"depth": 4, "time": None}
+
+    def __init__(self, processes=None, tt_size_mb=16):
+        self.processes = processes or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.processes, initializer=WorkerState.initialize,
+                                             initargs=(TranspositionTable, tt_size_mb))
+
+    def close(self):
+        self._executor.shutdown()
+
+    def analyse_many(self, fens, limits=None):
+        # fens: iterable of FEN or EPD strings, limits: {"depth": maximal depth, "time": seconds per position or None}.
+        # Yields one result dict per position with the FEN, best move, score, completed depth, nodes, time and PV, or
+        # with an error message if the FEN can not be read.
+        limits = dict(PositionAnalyser.DEFAULT_LIMITS, **(limits or {}))
+        board = ChessBoard()
+        futures_by_key = {}
+        pending = deque()
+        for fen in fens:
+            try:
+                board.load_from_fen(PositionAnalyser.get_fen(fen))
+                key = board.hash_key
+            except (IndexError, KeyError, ValueError) as error:
+                pending.append((fen, None, f"Invalid position: {error}"))
+            else:
+                future = futures_by_key.get(key)
+                if future is None:
+                    future = self._executor.submit(_analyse_position, PositionAnalyser.get_fen(fen), limits["depth"], limits["time"])
+                    futures_by_key[key] = future
+                pending.append((fen, future, None))
+            while len(pending) > self.processes * PositionAnalyser.MAX_PENDING_PER_PROCESS:
+                yield PositionAnalyser._get_result(*pending.popleft())
+                # Results of positions that are no longer waited for are not needed for the deduplication
+                if len(futures_by_key) > self.processes * PositionAnalyser.MAX_PENDING_PER_PROCESS * 16:
+                    futures_by_key = {key: future for key, future in futures_by_key.items() if not future.done()}
+        while pending:
+            yield PositionAnalyser._get_result(*pending.popleft())
+
+    @staticmethod
+    def get_fen(line):
+        # An EPD line has the four position fields of a FEN followed by operations ("bm e4; id ..."), the search only
+        # needs the pieces and the player to move
+        return " ".join(line.split()[:4])
+
+    @staticmethod
+    def _get_result(fen, future, error):
+        if future is None:
+            return {"fen": fen, "error": error}
+        return dict({"fen": fen}, **future.result())
+
+
+def read_positions(file):
+    # Non-empty lines of an EPD/FEN file, comments start with #
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse the positions of an EPD/FEN file, one JSON line per position.")
+    parser.add_argument("file", help="EPD or FEN file, one position per line, - for stdin")
+    parser.add_argument("--depth", type=int, default=PositionAnalyser.DEFAULT_LIMITS["depth"], help="maximal search depth")
+    parser.add_argument("--time", type=float, default=None, help="time limit per position in seconds")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--tt-size", type=float, default=16, help="transposition table size per worker in MB")
+    arguments = parser.parse_args()
+
+    analyser = PositionAnalyser(arguments.processes, arguments.tt_size)
+    input_file = sys.stdin if arguments.file == "-" else open(arguments.file)
+    try:
+        for result in analyser.analyse_many(read_positions(input_file), {"depth": arguments.depth, "time": arguments.time}):
+            print(json.dumps(result), flush=True)
+    finally:
+        analyser.close()
+        if input_file is not sys.stdin:
+            input_file.close()
@@ -0,0 +1,87 @@
+from ChessEngine import ChessEngine
+import constants
+
+
+class PositionStatus:
+    """
+    Everything that decides whether the game is over in a position, determined once: check, check mate, the
+    opponent's king on the hill, the opponent in check mate, the draws by stalemate, repetition and the 50 moves rule,
+    and the legal moves. The search, the evaluation and the game loop read the status instead of asking ChessEngine
+    for every part, which generated the legal moves again for each question.
+
+    The legal moves are generated on first use (a node cut off by the stand pat or the transposition table never
+    needs them), which has to happen before the next move is made on the board. A status describes the position it
+    was created for and is outdated after the next move. With a buffer of MoveBuffers the legal moves are generated
+    into it as MoveEncoding integers and given as an array of them, as the search uses them; without as the
+    (from_square, to_square) tuples of ChessEngine.generate_legal_moves().
+
+    There is no draw by insufficient material: in king of the hill a lone king still wins by reaching the centre.
+    """
+
+    CHECKMATE = "checkmate"
+    KING_OF_THE_HILL = "king of the hill"
+    STALEMATE = "stalemate"
+    REPETITION = "repetition"
+    FIFTY_MOVES = "50 moves rule"
+
+    HILL = int("0b0000000000000000000000000001100000011000000000000000000000000000", 2)
+
+    __slots__ = ("_board", "_buffer", "_legal_moves", "player", "in_check", "opponent_is_on_hill", "opponent_is_check_mate", "is_repetition",
+                 "is_fifty_moves")
+
+    def __init__(self, board, buffer=None):
+        self._board = board
+        self._buffer = buffer
+        self._legal_moves = None
+        self.player = board.current_player
+        opponent = board.get_opponent(self.player)
+        self.in_check = ChessEngine.is_in_check(board)
+        self.opponent_is_on_hill = bool(board.bitboards[constants.KING] & PositionStatus.HILL & board.bitboards[opponent])
+        # Only in set up positions the player to move can attack the opponent's king
+        self.opponent_is_check_mate = ChessEngine.is_in_check(board, isOpponent=True) and not ChessEngine._can_escape_check(board)
+        self.is_repetition = ChessEngine._is_repetition_draw(board)
+        self.is_fifty_moves = board.pawn_not_moved_counter >= 50
+
+    @property
+    def legal_moves(self):
+        if self._legal_moves is None:
+            if self._buffer is None:
+                self._legal_moves = ChessEngine.generate_legal_moves(self._board)
+            else:
+                self._legal_moves = self._buffer[:ChessEngine.generate_encoded_legal_moves(self._board, self._buffer)]
+        return self._legal_moves
+
+    @property
+    def is_check_mate(self):
+        return self.in_check and not self.legal_moves
+
+    @property
+    def is_stalemate(self):
+        return not self.in_check and not self.legal_moves
+
+    @property
+    def result(self):
+        # None while the game goes on, else the winner or constants.DRAW like ChessBoard.game_result
+        return self.get_result()[0]
+
+    @property
+    def reason(self):
+        return self.get_result()[1]
+
+    def get_result(self, with_stalemate=True):
+        # (result, reason), draws take precedence as in the game loop. Without with_stalemate the legal moves are only
+        # generated in check (to find a check mate) and a stalemate is only reported if they are already known.
+        opponent = self._board.get_opponent(self.player)
+        if self.is_repetition:
+            return constants.DRAW, PositionStatus.REPETITION
+        if self.is_fifty_moves:
+            return constants.DRAW, PositionStatus.FIFTY_MOVES
+        if (with_stalemate or self._legal_moves is not None) and self.is_stalemate:
+            return constants.DRAW, PositionStatus.STALEMATE
+        if self.is_check_mate:
+            return opponent, PositionStatus.CHECKMATE
+        if self.opponent_is_on_hill:
+            return opponent, PositionStatus.KING_OF_THE_HILL
+        if self.opponent_is_check_mate:
+            return self.player, PositionStatus.CHECKMATE
+        return None, None
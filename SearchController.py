@@ -0,0 +1,68 @@
+import time
+from SearchTimeoutException import SearchTimeoutException
+
+
+class SearchController:
+    """
+    Keeps the time of one search and the best root move found so far.
+
+    The search calls check() for every node, the clock is only read every check_interval nodes. When the deadline
+    has passed a SearchTimeoutException is raised, which unwinds the search to iterative_depth_search(). The root
+    moves that were completely searched before are reported with report_root_move(), so that the iteration can still
+    give a result.
+    """
+
+    DEFAULT_MOVES_TO_GO = 30
+    # Never plan to use more than this fraction of the remaining time for one move
+    MAX_TIME_FRACTION = 0.5
+    # Time kept back for returning the move after the deadline (seconds)
+    SAFETY_MARGIN = 0.05
+
+    def __init__(self, time_limit=None, check_interval=16, stop_flag=None):
+        # stop_flag: optional shared buffer, the search stops as if the time was up when its first byte is set
+        self.start_time = time.perf_counter()
+        self.deadline = None if time_limit is None else self.start_time + max(0.0, time_limit - SearchController.SAFETY_MARGIN)
+        self.check_interval = check_interval
+        self.nodes = 0
+        self.timed_out = False
+        self.stop_flag = stop_flag
+        # Deepest iteration that was searched completely and the score of the move returned by the search, from the
+        # view of the player to move
+        self.completed_depth = 0
+        self.best_score = None
+        self.iteration_best_move = None
+        self.iteration_best_score = None
+        self.iteration_first_move = None
+
+    def check(self):
+        self.nodes += 1
+        if self.nodes % self.check_interval == 0:
+            if (self.deadline is not None and time.perf_counter() >= self.deadline) or (self.stop_flag is not None and self.stop_flag[0]):
+                self.timed_out = True
+                raise SearchTimeoutException()
+
+    def start_iteration(self):
+        self.iteration_best_move = None
+        self.iteration_best_score = None
+        self.iteration_first_move = None
+
+    def report_root_move(self, move, score):
+        # Called after a root move was searched completely in the current iteration
+        if self.iteration_first_move is None:
+            self.iteration_first_move = move
+        if self.iteration_best_score is None or score > self.iteration_best_score:
+            self.iteration_best_move = move
+            self.iteration_best_score = score
+
+    def elapsed_time(self):
+        return time.perf_counter() - self.start_time
+
+    def remaining_time(self):
+        return None if self.deadline is None else self.deadline - time.perf_counter()
+
+    @staticmethod
+    def allocate_time(remaining_time, increment=0, moves_to_go=None):
+        # Time for the next move from the game clock (all values in seconds)
+        moves_to_go = moves_to_go or SearchController.DEFAULT_MOVES_TO_GO
+        planned_time = remaining_time / moves_to_go + increment
+        return max(0.0, min(planned_time, remaining_time * SearchController.MAX_TIME_FRACTION))
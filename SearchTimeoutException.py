@@ -0,0 +1,7 @@
+
+class SearchTimeoutException(Exception):
+    """Exception raised inside the search when the time for the move is used up."""
+
+    def __init__(self, message="Time for the search is up."):
+        self.message = message
+        super().__init__(self.message)
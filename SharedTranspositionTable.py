@@ -0,0 +1,62 @@
+import struct
+from multiprocessing import shared_memory
+from TranspositionTable import TranspositionTable
+
+_WORD = struct.Struct("Q")
+_DOUBLE = struct.Struct("d")
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    Transposition table in shared memory that several processes read and write without locks.
+
+    The entries have the same layout as in TranspositionTable, but the first word holds key ^ data ^ score bits
+    instead of the key. Two processes may write the same entry at the same time and leave the words of different
+    entries behind; such a torn entry does not give back its key on probe and is ignored like an empty slot.
+
+    The creating process owns the memory (create=True) and has to unlink() it, the other processes attach with the
+    name. The counters (probes, hits, ...) are kept per process.
+    """
+
+    def __init__(self, size_mb=16, name=None):
+        if name is None:
+            self._shared_memory = shared_memory.SharedMemory(create=True, size=TranspositionTable.get_buffer_size(size_mb))
+        else:
+            self._shared_memory = shared_memory.SharedMemory(name=name)
+        self.name = self._shared_memory.name
+        self.size_mb = size_mb
+        super().__init__(size_mb, self._shared_memory.buf)
+
+    def close(self):
+        # The views have to be released before the shared memory can be closed
+        self._words.release()
+        self._scores.release()
+        self._buffer = None
+        self._shared_memory.close()
+
+    def unlink(self):
+        self._shared_memory.unlink()
+
+    def probe(self, key):
+        self.probes += 1
+        index = (key & self._bucket_mask) * TranspositionTable.BUCKET_SIZE * 3
+        words = self._words
+        for slot in (index, index + 3):
+            # Every word is read once, so the check only passes if the three words belong to the same entry
+            check, data, score_bits = words[slot], words[slot + 1], words[slot + 2]
+            if data and check ^ data ^ score_bits == key:
+                self.hits += 1
+                return TranspositionTable._unpack_entry(data, _DOUBLE.unpack(_WORD.pack(score_bits))[0])
+        return None
+
+    def _get_slot_key(self, slot):
+        words = self._words
+        return words[slot] ^ words[slot + 1] ^ words[slot + 2]
+
+    def _write_slot(self, slot, key, data, score):
+        # The check word is built from this entry's own score bits: reading the score word back could see the score
+        # of another process writing the same slot, and the mixed entry would pass the check
+        words = self._words
+        self._scores[slot + 2] = score
+        words[slot + 1] = data
+        words[slot] = key ^ data ^ _WORD.unpack(_DOUBLE.pack(score))[0]
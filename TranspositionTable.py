@@ -0,0 +1,131 @@
+class TranspositionTable:
+    """
+    Fixed-size transposition table for the alpha-beta search.
+
+    The table is allocated once with the given size in MB and never grows. Every entry is packed into three 64-bit
+    words: the position key, a data word (best move, bound type, depth and search age) and the score as double.
+    Two entries form a bucket: the first one is only replaced by deeper (or outdated) results, the second one is
+    always replaced. Scores are stored from the point of view of the player to move in the stored position, the best
+    move as MoveEncoding integer like the search uses it.
+    """
+
+    EXACT = 1
+    LOWER_BOUND = 2
+    UPPER_BOUND = 3
+
+    ENTRY_SIZE = 3 * 8  # key, data and score
+    BUCKET_SIZE = 2
+
+    # Layout of the data word
+    _MOVE_MASK = (1 << 15) - 1  # the move as MoveEncoding (14 bits) and a flag that a move is stored
+    _HAS_MOVE = 1 << 14
+    _BOUND_SHIFT = 15
+    _DEPTH_SHIFT = 17
+    _AGE_SHIFT = 25
+
+    def __init__(self, size_mb=16, buffer=None):
+        # buffer: memory for the entries (e.g. shared memory), a new bytearray if None
+        self.bucket_count = TranspositionTable.get_bucket_count(size_mb)
+        self._bucket_mask = self.bucket_count - 1
+        self._buffer = bytearray(TranspositionTable.get_buffer_size(size_mb)) if buffer is None else buffer
+        self._words = memoryview(self._buffer).cast("Q")
+        self._scores = memoryview(self._buffer).cast("d")
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0
+
+    @staticmethod
+    def get_bucket_count(size_mb):
+        bucket_count = max(1, int(size_mb * 1024 * 1024) // (TranspositionTable.ENTRY_SIZE * TranspositionTable.BUCKET_SIZE))
+        # Use a power of two, so that the bucket is found with a mask instead of a modulo
+        return 1 << (bucket_count.bit_length() - 1)
+
+    @staticmethod
+    def get_buffer_size(size_mb):
+        return TranspositionTable.get_bucket_count(size_mb) * TranspositionTable.BUCKET_SIZE * TranspositionTable.ENTRY_SIZE
+
+    @property
+    def size_in_bytes(self):
+        return self.bucket_count * TranspositionTable.BUCKET_SIZE * TranspositionTable.ENTRY_SIZE
+
+    def new_search(self):
+        # Entries of older searches may be replaced in the depth-preferred slot
+        self.age = (self.age + 1) & 0xFF
+
+    def clear(self):
+        self._buffer[:self.size_in_bytes] = bytes(self.size_in_bytes)
+        self.age = 0
+        self.probes = self.hits = self.stores = self.collisions = 0
+
+    def probe(self, key):
+        # Returns (depth, score, bound, move) for the position key or None
+        self.probes += 1
+        index = (key & self._bucket_mask) * TranspositionTable.BUCKET_SIZE * 3
+        words = self._words
+        for slot in (index, index + 3):
+            data = words[slot + 1]
+            if data and words[slot] == key:
+                self.hits += 1
+                return TranspositionTable._unpack_entry(data, self._scores[slot + 2])
+        return None
+
+    def store(self, key, depth, score, bound, move=None):
+        index = (key & self._bucket_mask) * TranspositionTable.BUCKET_SIZE * 3
+        words = self._words
+        data = words[index + 1]
+        # depth-preferred slot: empty, same position, not deeper than the new result or from an older search
+        if (not data or self._get_slot_key(index) == key or ((data >> TranspositionTable._DEPTH_SHIFT) & 0xFF) <= depth
+                or ((data >> TranspositionTable._AGE_SHIFT) & 0xFF) != self.age):
+            slot = index
+        else:
+            slot = index + 3
+            data = words[slot + 1]
+        same_key = bool(data) and self._get_slot_key(slot) == key
+        if data and not same_key:
+            self.collisions += 1
+        if move is None and same_key:
+            # Keep the best move of an earlier search of this position for the move ordering
+            encoded_move = data & TranspositionTable._MOVE_MASK
+        else:
+            encoded_move = TranspositionTable._encode_move(move)
+        self._write_slot(slot, key, encoded_move | (bound << TranspositionTable._BOUND_SHIFT)
+                         | (min(depth, 0xFF) << TranspositionTable._DEPTH_SHIFT) | (self.age << TranspositionTable._AGE_SHIFT), score)
+        self.stores += 1
+
+    def _get_slot_key(self, slot):
+        return self._words[slot]
+
+    def _write_slot(self, slot, key, data, score):
+        self._words[slot] = key
+        self._words[slot + 1] = data
+        self._scores[slot + 2] = score
+
+    def get_statistics(self):
+        return {
+            "size_in_bytes": self.size_in_bytes,
+            "probes": self.probes,
+            "hits": self.hits,
+            "stores": self.stores,
+            "collisions": self.collisions,
+        }
+
+    @staticmethod
+    def _unpack_entry(data, score):
+        return (
+            (data >> TranspositionTable._DEPTH_SHIFT) & 0xFF,
+            score,
+            (data >> TranspositionTable._BOUND_SHIFT) & 0x3,
+            TranspositionTable._decode_move(data),
+        )
+
+    @staticmethod
+    def _encode_move(move):
+        return 0 if move is None else TranspositionTable._HAS_MOVE | move
+
+    @staticmethod
+    def _decode_move(data):
+        if not data & TranspositionTable._HAS_MOVE:
+            return None
+        return data & (TranspositionTable._HAS_MOVE - 1)
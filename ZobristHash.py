@@ -0,0 +1,43 @@
+import random
+import constants
+
+# Fixed seed, the keys have to be identical in every process (e.g. for an opening book)
+_random = random.Random(0x5EED_C4E55)
+
+
+class ZobristHash:
+    """
+    64-bit Zobrist keys for the positions of a ChessBoard.
+
+    Every (colour, piece, square) combination and the side to move get a fixed random key. The key of a position
+    is the XOR of the keys of all pieces on the board (plus the side key if black is to move), so a move can update
+    it with a few XORs instead of rehashing the bitboards.
+    """
+
+    # PIECE_KEYS[color][piece][square_index], the piece constants are used directly as index
+    PIECE_KEYS = [
+        [[_random.getrandbits(64) for _ in range(64)] if piece >= constants.PAWN else None for piece in range(constants.KING + 1)]
+        for _ in (constants.WHITE, constants.BLACK)
+    ]
+    BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+
+    def __init__(self) -> None:
+        pass
+
+    @staticmethod
+    def compute(board):
+        # Compute the key of a board from scratch, only needed after the bitboards were set up
+        key = ZobristHash.BLACK_TO_MOVE_KEY if board.current_player == constants.BLACK else 0
+        for color in (constants.WHITE, constants.BLACK):
+            for piece in range(constants.PAWN, constants.KING + 1):
+                pieces = board.bitboards[color] & board.bitboards[piece]
+                while pieces:
+                    square = pieces & -pieces
+                    key ^= ZobristHash.PIECE_KEYS[color][piece][square.bit_length() - 1]
+                    pieces &= pieces - 1
+        return key
+
+    @staticmethod
+    def piece_key(color, piece, square):
+        # Key of a single piece on a square given as bitboard
+        return ZobristHash.PIECE_KEYS[color][piece][square.bit_length() - 1]
@@ -3,6 +3,8 @@ from ChessBoard import ChessBoard
 import time
 
 from ChessGame import ChessGame
+from Perft import Perft
+from LazySmpSearch import LazySmpSearch
 
 
 class ChessEngineBenchmark:
@@ -21,8 +23,7 @@ class ChessEngineBenchmark:
             start_time = time.time()
 
             # Your chess engine implementation
-            moves = ChessEngine.generate_moves(board)
-            moves = ChessEngine.filter_illegal_moves(board, moves)
+            moves = ChessEngine.generate_legal_moves(board)
 
             end_time = time.time()
             elapsed_time = end_time - start_time
@@ -62,9 +63,40 @@ class ChessEngineBenchmark:
             average_time = round(average_time, 4)  # Round to 4 decimal places
             print(f"Depth: {depth}")
             print(f"Counter: {counter}")
+            if with_cut_off:
+                print(f"Transposition table: {game.transposition_table.get_statistics()}")
             print(f"Best Move: {ChessEngine.binary_move_to_algebraic(move[0], move[1])}")
             print(f"Time: {average_time:.4f} seconds\n")
 
+    @staticmethod
+    def benchmark_perft(max_depth=4, processes=None):
+        # Move generation throughput on the reference positions, the node counts have to match
+        print("Perft")
+        if not Perft.run_suite(max_depth, processes):
+            print("Perft node counts differ from the expected values!")
+
+    @staticmethod
+    def benchmark_lazy_smp(fen, depth=5, worker_counts=(1, 2, 4, 8)):
+        # Time to depth with the shared transposition table for different numbers of worker processes
+        print("Lazy SMP")
+        print(f"FEN: {fen}")
+        single_worker_time = None
+        for workers in worker_counts:
+            search = LazySmpSearch(workers)
+            board = ChessBoard()
+            board.load_from_fen(fen)
+            try:
+                start_time = time.time()
+                move, counter, _ = search.search(board, depth)
+                elapsed_time = time.time() - start_time
+            finally:
+                search.close()
+            single_worker_time = single_worker_time or elapsed_time
+            print(f"Workers: {workers}")
+            print(f"Counter: {counter}")
+            print(f"Best Move: {ChessEngine.binary_move_to_algebraic(move[0], move[1])}")
+            print(f"Time to depth {depth}: {elapsed_time:.4f} seconds, speedup {single_worker_time / elapsed_time:.2f}\n")
+
     def benchmark_fen1(self):
         fen1 = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w"
         self.benchmark_chess_engine(fen1)
@@ -112,6 +144,8 @@ class ChessEngineBenchmark:
 
 if __name__ == "__main__":
     benchmark = ChessEngineBenchmark()
+    # benchmark.benchmark_perft()
+    # benchmark.benchmark_lazy_smp("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
     # benchmark.benchmark_fen1()
     # benchmark.benchmark_fen2()
     # benchmark.benchmark_fen3()
@@ -1,3 +1,8 @@
+import random
+import math
+import os
+import tempfile
+import time
 import unittest
 from ChessBoard import ChessBoard
 from ChessEngine import ChessEngine
@@ -5,6 +10,24 @@ from ChessGame import ChessGame
 from IllegalMoveException import IllegalMoveException
 import constants
 from ChessPrintService import ChessPrintService
+from ZobristHash import ZobristHash
+from TranspositionTable import TranspositionTable
+from SearchController import SearchController
+from SearchTimeoutException import SearchTimeoutException
+from MoveOrderer import MoveOrderer
+from Perft import Perft
+from ParallelSearch import ParallelSearch
+from SharedTranspositionTable import SharedTranspositionTable
+from LazySmpSearch import LazySmpSearch
+from BatchEvaluator import BatchEvaluator
+from PositionAnalyser import PositionAnalyser
+from Position import Position
+from MoveEncoding import MoveEncoding, MoveBuffers
+from PositionStatus import PositionStatus
+from OpeningBook import OpeningBook
+from EndgameTablebase import EndgameTablebase
+import AttackTables
+import PieceSquareTables
 
 
 class TestChessBitboard(unittest.TestCase):
@@ -612,6 +635,94 @@ class TestChessBitboard(unittest.TestCase):
         actualBoard.load_from_fen("rnbq1bnr/pppppppp/8/8/5P2/4k3/PPPPP1PP/RNBQKBNR b KQha - 0 1")
         self.assertIsInCheck(actualBoard)
 
+    def test_is_square_attacked_1(self):
+        # A square is attacked exactly if the opponent has a pseudo-legal move to it
+        fens = [
+            "r2qr1k1/p4ppp/2Q1b3/4N3/5B2/3BnP2/PP4PP/R4RK1 w - - 0 19",
+            "r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1",
+            "2k5/6q1/3P1P2/4N3/8/1K6/8/8 w - - 0 1",
+        ]
+        for fen in fens:
+            actualBoard = ChessBoard()
+            actualBoard.load_from_fen(fen)
+            for by_color in (constants.WHITE, constants.BLACK):
+                actualBoard.current_player = by_color
+                targets = 0
+                for _, to_square in ChessEngine.generate_moves(actualBoard):
+                    targets |= to_square
+                # Pawns only attack diagonally, but their forward moves never end on an occupied square
+                occupied = actualBoard.bitboards[ChessBoard.get_opponent(by_color)]
+                for index in range(64):
+                    square = 1 << index
+                    if square & occupied:
+                        self.assertEqual(bool(targets & square), ChessEngine.is_square_attacked(actualBoard, square, by_color),
+                                         ChessEngine.binary_field_to_algebraic(square) + " in " + fen)
+
+    def test_generate_legal_moves_1(self):
+        # Same legal moves as performing every pseudo-legal move, also one and two moves deep
+        fens = [
+            "r2qr1k1/p4ppp/2Q1b3/4N3/5B2/3BnP2/PP4PP/R4RK1 w - - 0 19",
+            "r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1",
+            "rnb1kbnr/pppp1ppp/4p3/8/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 0 1",
+            "4k3/4r3/8/1b6/8/2N1B3/3P4/q3K2R w - - 0 1",
+        ]
+        for fen in fens:
+            actualBoard = ChessBoard()
+            actualBoard.load_from_fen(fen)
+            for move in ChessEngine.generate_legal_moves(actualBoard) + [None]:
+                if move:
+                    actualBoard.make_move(move)
+                for reply in ChessEngine.generate_legal_moves(actualBoard) + [None]:
+                    if reply:
+                        actualBoard.make_move(reply)
+                    self.assertEqual(ChessEngine.generate_legal_moves(actualBoard, with_pin_detection=False),
+                                     ChessEngine.generate_legal_moves(actualBoard),
+                                     ChessPrintService.get_board_string(actualBoard.bitboards))
+                    if reply:
+                        actualBoard.unmake_move()
+                if move:
+                    actualBoard.unmake_move()
+
+    def test_generate_legal_moves_2(self):
+        # The knight on e2, the bishop on d2 and the pawn on f2 are pinned, the bishop may still move along the pin
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("k3r3/8/8/b7/7q/8/3BNP2/4K3 w - - 0 1")
+        legal_moves = [ChessEngine.binary_move_to_algebraic(*move) for move in ChessEngine.generate_legal_moves(actualBoard)]
+        self.assertEqual([], [move for move in legal_moves if move.startswith('e2') or move.startswith('f2')])
+        self.assertEqual(['d2c3', 'd2b4', 'd2a5'], [move for move in legal_moves if move.startswith('d2')])
+        self.assertIn('e1d1', legal_moves)
+
+    def test_generate_legal_moves_3(self):
+        # Double check by rook and knight: only the king may move
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("k3r3/8/8/8/8/3n4/3B4/Q3K3 w - - 0 1")
+        legal_moves = [ChessEngine.binary_move_to_algebraic(*move) for move in ChessEngine.generate_legal_moves(actualBoard)]
+        self.assertEqual(['e1d1', 'e1f1'], sorted(legal_moves))
+
+    def test_attack_tables_1(self):
+        self.assertEqual(constants.B3 | constants.C2, AttackTables.KNIGHT_ATTACKS[0])
+        self.assertEqual(constants.C6 | constants.E6 | constants.B5 | constants.F5 | constants.B3 | constants.F3 | constants.C2 | constants.E2,
+                         AttackTables.KNIGHT_ATTACKS[(constants.D4).bit_length() - 1])
+        self.assertEqual(constants.G8 | constants.G7 | constants.H7, AttackTables.KING_ATTACKS[63])
+        self.assertEqual(constants.B3, AttackTables.PAWN_ATTACKS[constants.WHITE][(constants.A2).bit_length() - 1])
+        self.assertEqual(constants.G6 | constants.E6, AttackTables.PAWN_ATTACKS[constants.BLACK][(constants.F7).bit_length() - 1])
+
+    def test_attack_tables_2(self):
+        # The sliding lookup has to match walking every ray square by square
+        generator = random.Random(42)
+        for _ in range(200):
+            occupied = generator.getrandbits(64) & generator.getrandbits(64)
+            index = generator.randrange(64)
+            for directions, masks, attacks in ((AttackTables.ROOK_DIRECTIONS, AttackTables.ROOK_MASKS, AttackTables.ROOK_ATTACKS),
+                                               (AttackTables.BISHOP_DIRECTIONS, AttackTables.BISHOP_MASKS, AttackTables.BISHOP_ATTACKS)):
+                expected = 0
+                for row_step, col_step in directions:
+                    for square in AttackTables._ray(index, row_step, col_step):
+                        expected |= 1 << square
+                        if occupied & (1 << square):
+                            break
+                self.assertEqual(expected, attacks[index][occupied & masks[index]])
+
     def test_is_check_mate_1(self):
         actualBoard = ChessBoard()
         actualBoard.load_from_fen("rnb1kbnr/ppppqppp/5p2/8/8/5P2/PPPP1PPP/RNBQKBNR w KQkq - 0 1")
@@ -744,6 +855,55 @@ class TestChessBitboard(unittest.TestCase):
         self.assertEqualBitboards(expectedBoard, actualBoard)
         self.assertTrue(ChessEngine.is_draw(ChessEngine.generate_moves(actualBoard), actualBoard))
 
+    def test_draw_by_repitition_5(self):
+        # Taking moves back also takes back the repetitions
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("1kr5/1b3R2/4p3/4Pn1p/8/2P3p1/1KP4r/6B1 w - - 0 1")
+        for _ in range(3):
+            for move in ['g1a7', 'b8a8', 'a7g1', 'a8b8']:
+                actualBoard.make_move(ChessEngine.algebraic_move_to_binary(move))
+        self.assertTrue(ChessEngine._is_repetition_draw(actualBoard))
+        for _ in range(4):
+            actualBoard.unmake_move()
+        self.assertFalse(ChessEngine._is_repetition_draw(actualBoard))
+        for move in ['g1a7', 'b8a8', 'a7g1', 'a8b8']:
+            actualBoard.make_move(ChessEngine.algebraic_move_to_binary(move))
+        self.assertTrue(ChessEngine._is_repetition_draw(actualBoard))
+        for _ in range(12):
+            actualBoard.unmake_move()
+        self.assertEqual({}, actualBoard.position_counts)
+
+    def test_position_status_1(self):
+        # Check mate, king of the hill, stalemate and a running game
+        for fen, expected_result, expected_reason in (
+                ("rnb1kbnr/pppp1ppp/4p3/8/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 0 1", constants.BLACK, PositionStatus.CHECKMATE),
+                ("r1bqk1nr/8/2n3P1/p1bP4/4KPp1/p1N5/8/R1B2BNR b HAkq - 0 1", constants.WHITE, PositionStatus.KING_OF_THE_HILL),
+                ("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1", constants.DRAW, PositionStatus.STALEMATE),
+                ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", None, None)):
+            actualBoard = ChessBoard()
+            actualBoard.load_from_fen(fen)
+            status = PositionStatus(actualBoard)
+            self.assertEqual((expected_result, expected_reason), status.get_result())
+            self.assertEqual(ChessEngine.generate_legal_moves(actualBoard), status.legal_moves)
+
+    def test_position_status_2(self):
+        # Repetition is found without generating the moves, a stalemate only when asked for
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("1kr5/1b3R2/4p3/4Pn1p/8/2P3p1/1KP4r/6B1 w - - 0 1")
+        for _ in range(3):
+            for move in ['g1a7', 'b8a8', 'a7g1', 'a8b8']:
+                actualBoard.make_move(ChessEngine.algebraic_move_to_binary(move))
+        self.assertEqual((constants.DRAW, PositionStatus.REPETITION), PositionStatus(actualBoard).get_result(with_stalemate=False))
+        actualBoard.load_from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        status = PositionStatus(actualBoard)
+        self.assertEqual((None, None), status.get_result(with_stalemate=False))
+        self.assertEqual(constants.DRAW, status.result)
+        self.assertTrue(ChessEngine.is_draw(status.legal_moves, actualBoard))
+        # The search scores the stalemate like the other draws
+        score, _, variation = actualBoard.negamax(-math.inf, math.inf, 2, 0)
+        self.assertEqual(actualBoard.evaluate_board(), score)
+        self.assertEqual([], variation)
+
     def test_convert_pawn_1(self):
         actualBoard = ChessBoard()
         expectedBoard = ChessBoard()
@@ -774,7 +934,7 @@ class TestChessBitboard(unittest.TestCase):
         actualBoard.load_from_fen("r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1")
         actualGame = ChessGame(actualBoard, isBlackAI=True, isWhiteAI=True)
         actualGame.process_next_move(3)
-        expectedBoard.load_from_fen("r1bqk1nr/8/2n3P1/p1bP4/3pPPp1/p1N5/8/R1B1KBNR b KQkq - 0 1")
+        expectedBoard.load_from_fen("r2qk1nr/8/2n3P1/p1bP3p/3pPPb1/p1N5/8/R1B1KBNR b KQkq - 0 1")
         self.assertEqualBitboards(expectedBoard, actualBoard)
 
     def test_alpha_beta_2(self):
@@ -791,6 +951,648 @@ class TestChessBitboard(unittest.TestCase):
         actualBoard.load_from_fen("r1bqk1nr/8/2n3P1/p1bP4/4KPp1/p1N5/8/R1B2BNR b HAkq - 0 1")
         self.assertTrue(ChessEngine.is_game_over(actualBoard))
 
+    def test_make_unmake_move_1(self):
+        # Every legal move including captures has to be taken back completely
+        actualBoard = ChessBoard()
+        expectedBoard = ChessBoard()
+        actualBoard.load_from_fen("r2qr1k1/p4ppp/2Q1b3/4N3/5B2/3BnP2/PP4PP/R4RK1 w - - 0 19")
+        expectedBoard.load_from_fen("r2qr1k1/p4ppp/2Q1b3/4N3/5B2/3BnP2/PP4PP/R4RK1 w - - 0 19")
+        for move in ChessEngine.filter_illegal_moves(actualBoard, ChessEngine.generate_moves(actualBoard)):
+            actualBoard.make_move(move)
+            actualBoard.unmake_move()
+            self.assertEqualBitboards(expectedBoard, actualBoard)
+            self.assertEqual(constants.WHITE, actualBoard.current_player)
+        self.assertEqual([], actualBoard.move_stack)
+        self.assertEqual({}, actualBoard.position_counts)
+
+    def test_make_unmake_move_2(self):
+        # Converting a pawn while capturing
+        actualBoard = ChessBoard()
+        expectedBoard = ChessBoard()
+        actualBoard.load_from_fen("6p1/5P2/8/8/8/8/8/8 w - - 0 1")
+        expectedBoard.load_from_fen("6p1/5P2/8/8/8/8/8/8 w - - 0 1")
+        actualBoard.pawn_not_moved_counter = 7
+        actualBoard.make_move(ChessEngine.algebraic_move_to_binary('f7g8'))
+        self.assertEqual(0, actualBoard.pawn_not_moved_counter)
+        actualBoard.unmake_move()
+        self.assertEqualBitboards(expectedBoard, actualBoard)
+        self.assertEqual(7, actualBoard.pawn_not_moved_counter)
+
+    def test_zobrist_hash_1(self):
+        # The incrementally updated key has to match a key computed from scratch, also for converted pawns
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r3k3/1P6/8/3q4/4N3/8/6p1/R3K2R w - - 0 1")
+        for move in ['b7a8', 'd5e4', 'e1d2', 'g2g1', 'h1g1']:
+            ChessEngine.perform_move(move, actualBoard, with_validation=False)
+            self.assertEqual(ZobristHash.compute(actualBoard), actualBoard.hash_key)
+        for _ in range(5):
+            actualBoard.unmake_move()
+            self.assertEqual(ZobristHash.compute(actualBoard), actualBoard.hash_key)
+
+    def test_zobrist_hash_2(self):
+        # Same pieces, but a different player to move
+        whiteBoard = ChessBoard()
+        blackBoard = ChessBoard()
+        blackBoard.load_from_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR b KQkq - 0 1")
+        self.assertNotEqual(whiteBoard.hash_key, blackBoard.hash_key)
+        ChessEngine.perform_move('g1f3', whiteBoard)
+        ChessEngine.perform_move('g8f6', whiteBoard)
+        ChessEngine.perform_move('f3g1', whiteBoard)
+        ChessEngine.perform_move('f6g8', whiteBoard)
+        self.assertEqual(ChessBoard().hash_key, whiteBoard.hash_key)
+
+    def test_incremental_evaluation_1(self):
+        # The running piece-square sums have to match the sums computed from scratch, also for converted pawns
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r3k3/1P6/8/3q4/4N3/8/6p1/R3K2R w - - 0 1")
+        for move in ['b7a8', 'd5e4', 'e1d2', 'g2g1', 'h1g1']:
+            ChessEngine.perform_move(move, actualBoard, with_validation=False)
+            self.assertEqual(PieceSquareTables.compute(actualBoard), actualBoard.pst_score)
+        for _ in range(5):
+            actualBoard.unmake_move()
+            self.assertEqual(PieceSquareTables.compute(actualBoard), actualBoard.pst_score)
+
+    def test_incremental_evaluation_2(self):
+        # Symmetric position: material and position cancel out, only the king safety terms remain
+        actualBoard = ChessBoard()
+        self.assertEqual(0, actualBoard.evaluate_board(with_king_safety=False))
+        self.assertAlmostEqual(1, actualBoard.evaluate_board())
+        # A won pawn for white, evaluated for the player to move
+        actualBoard.load_from_fen("rnbqkbnr/ppp1pppp/8/3P4/8/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1")
+        self.assertAlmostEqual(-1.25, actualBoard.evaluate_board(with_king_safety=False))
+        # After taking back the pawn, the queen controls the center
+        self.assertAlmostEqual(0.25, actualBoard.evaluate_board('d8d5', with_king_safety=False))
+        # A king move onto the hill only changes the center control, the hill bonus is taken before the move
+        actualBoard.load_from_fen("7k/8/8/8/8/4K3/8/8 w - - 0 1")
+        score = actualBoard.evaluate_board(with_king_safety=False)
+        self.assertAlmostEqual(score + 0.5 / 2 - 0.5 / 3, actualBoard.evaluate_board('e3e4', with_king_safety=False))
+
+    def test_transposition_table_1(self):
+        table = TranspositionTable(1)
+        move = MoveEncoding.from_algebraic(Position(), "e2e4")
+        self.assertIsNone(table.probe(12345))
+        table.store(12345, 3, -1.25, TranspositionTable.LOWER_BOUND, move)
+        self.assertEqual((3, -1.25, TranspositionTable.LOWER_BOUND, move), table.probe(12345))
+        table.store(12345, 4, 0.5, TranspositionTable.UPPER_BOUND)
+        # The best move of the position is kept if the new result has none
+        self.assertEqual((4, 0.5, TranspositionTable.UPPER_BOUND, move), table.probe(12345))
+        self.assertEqual({"size_in_bytes": table.size_in_bytes, "probes": 3, "hits": 2, "stores": 2, "collisions": 0}, table.get_statistics())
+        # The flags of the encoded move are kept
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("5r1k/4P3/8/8/8/8/8/K7 w - - 0 1")
+        move = MoveEncoding.from_algebraic(actualBoard, "e7f8")
+        table.store(54321, 1, 0.0, TranspositionTable.EXACT, move)
+        self.assertEqual(MoveEncoding.CAPTURE | MoveEncoding.PROMOTION, table.probe(54321)[3] & (MoveEncoding.CAPTURE | MoveEncoding.PROMOTION))
+
+    def test_transposition_table_2(self):
+        # The size never changes, colliding positions replace the always-replace slot of the bucket
+        table = TranspositionTable(1)
+        size = table.size_in_bytes
+        deep_key = 7
+        table.store(deep_key, 5, 1.0, TranspositionTable.EXACT)
+        for i in range(1, 10):
+            table.store(deep_key + i * table.bucket_count, 1, 0.0, TranspositionTable.EXACT)
+        self.assertEqual(5, table.probe(deep_key)[0])
+        self.assertIsNone(table.probe(deep_key + table.bucket_count))
+        self.assertEqual(1, table.probe(deep_key + 9 * table.bucket_count)[0])
+        self.assertEqual(8, table.collisions)
+        self.assertEqual(size, table.size_in_bytes)
+
+    def test_transposition_table_3(self):
+        # The search gives the same result with and without the table
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1")
+        table = TranspositionTable(1)
+        move_with_table, _, _ = actualBoard.iterative_depth_search(2, transposition_table=table)
+        move_without_table, _, _ = actualBoard.iterative_depth_search(2, with_cut_off=False)
+        self.assertEqual(move_without_table, move_with_table)
+        self.assertGreater(table.hits, 0)
+        self.assertGreater(table.stores, 0)
+
+    def test_search_controller_1(self):
+        # A search that runs out of time still returns a legal move and leaves the board unchanged
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1")
+        bitboards = list(actualBoard.bitboards)
+        hash_key = actualBoard.hash_key
+        start_time = time.perf_counter()
+        move, _, _ = actualBoard.iterative_depth_search(20, time_limit=0.3)
+        self.assertLess(time.perf_counter() - start_time, 1.0)
+        self.assertIn(move, ChessEngine.generate_legal_moves(actualBoard))
+        self.assertEqual(bitboards, actualBoard.bitboards)
+        self.assertEqual(hash_key, actualBoard.hash_key)
+        self.assertEqual([], actualBoard.move_stack)
+        self.assertEqual(constants.BLACK, actualBoard.current_player)
+
+    def test_search_controller_2(self):
+        self.assertAlmostEqual(2.0 + 1.0, SearchController.allocate_time(60.0, 1.0))
+        self.assertAlmostEqual(5.0, SearchController.allocate_time(10.0, 0.0, moves_to_go=2))
+        self.assertAlmostEqual(0.5, SearchController.allocate_time(1.0, 3.0))
+        controller = SearchController(0.0, check_interval=1)
+        self.assertRaises(SearchTimeoutException, controller.check)
+        self.assertTrue(controller.timed_out)
+
+    def test_move_orderer_1(self):
+        # The table move first, then captures of the most valuable victim by the least valuable attacker
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("7k/8/8/3q4/2P1R3/8/4b3/4K3 w - - 0 1")
+        orderer = MoveOrderer(ChessBoard.MAX_SEARCH_PLY)
+        legal_moves = PositionStatus(actualBoard, MoveBuffers(0)[0]).legal_moves
+        tt_move = MoveEncoding.from_algebraic(actualBoard, "e1f2")
+        moves = orderer.order_moves(actualBoard, legal_moves, 0, tt_move)
+        self.assertEqual(tt_move, moves[0])
+        self.assertEqual(["c4d5", "e4e2", "e1e2"], [MoveEncoding.to_algebraic(move) for move in moves[1:4]])
+        self.assertEqual(sorted(moves), sorted(legal_moves))
+
+    def test_move_orderer_2(self):
+        # A quiet move that caused a cut-off becomes a killer and gets a history score
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("7k/8/8/3q4/2P1R3/8/4b3/4K3 w - - 0 1")
+        orderer = MoveOrderer(ChessBoard.MAX_SEARCH_PLY)
+        legal_moves = PositionStatus(actualBoard, MoveBuffers(0)[0]).legal_moves
+        killer = MoveEncoding.from_algebraic(actualBoard, "e4h4")
+        orderer.record_cut_off(actualBoard, killer, 3, 2)
+        orderer.record_cut_off(actualBoard, MoveEncoding.from_algebraic(actualBoard, "c4d5"), 3, 2)
+        self.assertEqual([killer, None], orderer.killers[2])
+        moves = orderer.order_moves(actualBoard, legal_moves, 2)
+        self.assertEqual(killer, moves[3])
+        # In another ply only the history score puts it before the other quiet moves
+        moves = orderer.order_moves(actualBoard, legal_moves, 3)
+        self.assertEqual(killer, moves[3])
+
+    def test_move_orderer_3(self):
+        # The ordering reduces the number of searched nodes without changing the result
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+        # Same depth, cut-offs and no transposition table in both searches, only the orderer differs
+        score_ordered, counter_ordered, _ = actualBoard.negamax(-math.inf, math.inf, 3, 0, True, None, 0, None,
+                                                                MoveOrderer(ChessBoard.MAX_SEARCH_PLY))
+        score_unordered, counter_unordered, _ = actualBoard.negamax(-math.inf, math.inf, 3, 0, True, None, 0, None, None)
+        self.assertAlmostEqual(score_unordered, score_ordered)
+        self.assertLess(counter_ordered, counter_unordered)
+
+    def test_quiescence_1(self):
+        # At depth 1 the queen does not take a rook that is defended by a pawn
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("7k/8/4p3/3r4/8/8/8/K2Q4 w - - 0 1")
+        _, _, principal_variation = actualBoard.negamax(-math.inf, math.inf, 1, 0)
+        self.assertNotEqual(MoveEncoding.from_algebraic(actualBoard, "d1d5"), principal_variation[0])
+        self.assertIn(principal_variation[0], PositionStatus(actualBoard, MoveBuffers(0)[0]).legal_moves)
+
+    def test_quiescence_2(self):
+        # An undefended rook is taken in the quiescence search, a defended one is not
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("7k/8/8/3r4/8/8/8/K2Q4 w - - 0 1")
+        score, _ = actualBoard.quiescence(-math.inf, math.inf, 0)
+        self.assertGreater(score, actualBoard.evaluate_board() + 3)
+        actualBoard.load_from_fen("7k/8/4p3/3r4/8/8/8/K2Q4 w - - 0 1")
+        score, _ = actualBoard.quiescence(-math.inf, math.inf, 0)
+        self.assertAlmostEqual(actualBoard.evaluate_board(), score)
+        self.assertEqual([], actualBoard.move_stack)
+
+    def test_principal_variation_search_1(self):
+        # The null window searches give the same score as the search without any pruning
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r2qr1k1/p4ppp/2Q1b3/4N3/5B2/3BnP2/PP4PP/R4RK1 w - - 0 19")
+        score, _, _ = actualBoard.negamax(-math.inf, math.inf, 2, 0, True, TranspositionTable(1), 0, None, MoveOrderer(ChessBoard.MAX_SEARCH_PLY))
+        score_without_cut_off, _, _ = actualBoard.negamax(-math.inf, math.inf, 2, 0, False)
+        self.assertAlmostEqual(score_without_cut_off, score)
+
+    def test_principal_variation_search_2(self):
+        # The principal variation starts with the best move and is a sequence of legal moves
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+        move, _, principal_variation = actualBoard.iterative_depth_search(3)
+        self.assertEqual(move, principal_variation[0])
+        self.assertGreater(len(principal_variation), 1)
+        for variation_move in principal_variation:
+            self.assertIn(variation_move, ChessEngine.generate_legal_moves(actualBoard))
+            actualBoard.make_move(variation_move)
+
+    def test_null_move_1(self):
+        # Passing changes only the player to move and is taken back like a move
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+        bitboards = list(actualBoard.bitboards)
+        hash_key = actualBoard.hash_key
+        actualBoard.make_null_move()
+        self.assertEqual(constants.BLACK, actualBoard.current_player)
+        self.assertEqual(ZobristHash.compute(actualBoard), actualBoard.hash_key)
+        self.assertEqual({}, actualBoard.position_counts)
+        actualBoard.make_move((constants.C6, constants.D4))
+        actualBoard.unmake_move()
+        actualBoard.unmake_move()
+        self.assertEqual(bitboards, actualBoard.bitboards)
+        self.assertEqual(hash_key, actualBoard.hash_key)
+        self.assertEqual(constants.WHITE, actualBoard.current_player)
+
+    def test_null_move_2(self):
+        # No null move with only pawns left (zugzwang), with the opponent's king near the hill or twice in a row
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("7k/p7/8/8/8/8/PPP5/K7 w - - 0 1")
+        self.assertFalse(actualBoard._is_null_move_allowed(4, -10))
+        actualBoard.load_from_fen("7k/p7/8/8/8/8/PPP5/K6R w - - 0 1")
+        self.assertTrue(actualBoard._is_null_move_allowed(4, -10))
+        self.assertFalse(actualBoard._is_null_move_allowed(2, -10))
+        actualBoard.make_null_move()
+        actualBoard.make_null_move()
+        self.assertFalse(actualBoard._is_null_move_allowed(4, -10))
+        actualBoard.load_from_fen("8/p7/5k2/8/8/8/PPP5/K6R w - - 0 1")
+        self.assertFalse(actualBoard._is_null_move_allowed(4, -10))
+
+    def test_compact_position_1(self):
+        actualBoard = ChessBoard()
+        for move in ['g1f3', 'g8f6', 'f3g1', 'f6g8'] * 2:
+            ChessEngine.perform_move(move, actualBoard)
+        expectedBoard = ChessBoard()
+        expectedBoard.load_compact_position(actualBoard.get_compact_position())
+        self.assertEqualBitboards(actualBoard, expectedBoard)
+        self.assertEqual(actualBoard.hash_key, expectedBoard.hash_key)
+        self.assertEqual(actualBoard.pst_score, expectedBoard.pst_score)
+        self.assertEqual(actualBoard.pawn_not_moved_counter, expectedBoard.pawn_not_moved_counter)
+        # The four positions of the cycle were reached twice, reaching them again is a draw in both boards
+        self.assertEqual(actualBoard.position_counts, expectedBoard.position_counts)
+        self.assertEqual(4, len(expectedBoard.position_counts))
+        # A position reached only once is left out
+        ChessEngine.perform_move('e2e4', actualBoard)
+        self.assertNotIn(actualBoard.hash_key, actualBoard.get_compact_position().position_counts)
+
+    def test_position_1(self):
+        # A copy is independent of the original and the move generator works on a Position without a ChessBoard
+        actualBoard = ChessBoard()
+        ChessEngine.perform_move('e2e4', actualBoard)
+        position = actualBoard.copy()
+        self.assertFalse(hasattr(position, "__dict__"))
+        # The board the search runs on is slotted as well
+        self.assertFalse(hasattr(actualBoard, "__dict__"))
+        self.assertEqual(actualBoard.hash_key, position.hash_key)
+        self.assertEqual(actualBoard.position_counts, position.position_counts)
+        self.assertEqual(ChessEngine.generate_legal_moves(actualBoard), ChessEngine.generate_legal_moves(position))
+        position.make_move(ChessEngine.algebraic_move_to_binary('e7e5'))
+        self.assertEqual(constants.BLACK, actualBoard.current_player)
+        self.assertNotEqual(actualBoard.bitboards, position.bitboards)
+        self.assertNotEqual(actualBoard.hash_key, position.hash_key)
+        position.unmake_move()
+        self.assertEqual(actualBoard.bitboards, position.bitboards)
+        self.assertEqual(actualBoard.pst_score, position.pst_score)
+        self.assertEqual(9194, Perft.perft(Position(), 3))
+
+    def test_mailbox_1(self):
+        # The mailbox follows captures, promotions and their take back and the checker finds a difference
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("1n5k/P7/8/8/8/8/4r3/4K3 w - - 0 1")
+        self.assertEqual((constants.ROOK << 1) | constants.BLACK, actualBoard.mailbox[12])
+        actualBoard.make_move(ChessEngine.algebraic_move_to_binary('a7b8'))
+        self.assertEqual(constants.QUEEN, actualBoard._get_piece_at_square(1 << 57))
+        self.assertEqual(0, actualBoard.mailbox[48])
+        self.assertTrue(actualBoard.verify_mailbox())
+        actualBoard.make_move(ChessEngine.algebraic_move_to_binary('e2b2'))
+        self.assertEqual((constants.ROOK << 1) | constants.BLACK, actualBoard.mailbox[9])
+        self.assertTrue(actualBoard.verify_mailbox())
+        actualBoard.unmake_move()
+        actualBoard.unmake_move()
+        expectedBoard = ChessBoard()
+        expectedBoard.load_from_fen("1n5k/P7/8/8/8/8/4r3/4K3 w - - 0 1")
+        self.assertEqual(expectedBoard.mailbox, actualBoard.mailbox)
+        actualBoard.mailbox[12] = (constants.QUEEN << 1) | constants.BLACK
+        self.assertFalse(actualBoard.verify_mailbox())
+
+    def test_move_encoding_1(self):
+        # Conversions between tuples, algebraic notation and encoded moves with the capture and promotion flags
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("1n5k/P7/8/8/8/8/4r3/4K3 w - - 0 1")
+        for algebraic_move, is_capture, is_promotion in (("e1e2", True, False), ("a7a8", False, True), ("a7b8", True, True), ("e1d1", False, False)):
+            move = ChessEngine.algebraic_move_to_binary(algebraic_move)
+            encoded_move = MoveEncoding.encode(actualBoard, move)
+            self.assertLess(encoded_move, 1 << 16)
+            self.assertEqual(encoded_move, MoveEncoding.from_algebraic(actualBoard, algebraic_move))
+            self.assertEqual(move, MoveEncoding.to_tuple(encoded_move))
+            self.assertEqual(algebraic_move, MoveEncoding.to_algebraic(encoded_move))
+            self.assertEqual(is_capture, MoveEncoding.is_capture(encoded_move))
+            self.assertEqual(is_promotion, MoveEncoding.is_promotion(encoded_move))
+
+    def test_move_encoding_2(self):
+        # The encoded move generation gives the same moves in the same order as generate_legal_moves(), and an encoded
+        # move is made like its tuple
+        random_generator = random.Random(21)
+        buffer = MoveBuffers(0)[0]
+        for _, fen, _ in Perft.SUITE:
+            actualBoard = ChessBoard()
+            actualBoard.load_from_fen(fen)
+            expectedBoard = ChessBoard()
+            expectedBoard.load_from_fen(fen)
+            for _ in range(40):
+                legal_moves = ChessEngine.generate_legal_moves(actualBoard)
+                count = ChessEngine.generate_encoded_legal_moves(actualBoard, buffer)
+                self.assertEqual([MoveEncoding.encode(actualBoard, move) for move in legal_moves], list(buffer[:count]))
+                if not legal_moves:
+                    break
+                move_number = random_generator.randrange(count)
+                actualBoard.make_move(buffer[move_number])
+                expectedBoard.make_move(legal_moves[move_number])
+                self.assertEqualBitboards(expectedBoard, actualBoard)
+                self.assertEqual(expectedBoard.mailbox, actualBoard.mailbox)
+                self.assertEqual(expectedBoard.hash_key, actualBoard.hash_key)
+            while actualBoard.move_stack:
+                actualBoard.unmake_move()
+            expectedBoard.load_from_fen(fen)
+            self.assertEqualBitboards(expectedBoard, actualBoard)
+
+    def test_opening_book_1(self):
+        # Moves of several games are found by their position, weighted by how often they were played
+        games = [["e2e4", "e7e5", "g1f3"], ["e2e4", "c7c5"], ["d2d4", "d7d5"], ["e2e4", "e7e5", "b1c3"]]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.bin")
+            self.assertEqual(7, OpeningBook.build_from_games(path, games))
+            self.assertEqual(7 * OpeningBook.RECORD.size, os.path.getsize(path))
+            book = OpeningBook(path)
+            try:
+                actualBoard = ChessBoard()
+                moves = [(ChessEngine.binary_move_to_algebraic(*move), weight) for move, weight in book.get_moves(actualBoard)]
+                self.assertEqual([("e2e4", 3), ("d2d4", 1)], moves)
+                ChessEngine.perform_move("e2e4", actualBoard)
+                ChessEngine.perform_move("e7e5", actualBoard)
+                moves = sorted(ChessEngine.binary_move_to_algebraic(*move) for move, _ in book.get_moves(actualBoard))
+                self.assertEqual(["b1c3", "g1f3"], moves)
+                self.assertIn(book.choose_move(actualBoard, random.Random(24)), [ChessEngine.algebraic_move_to_binary(move) for move in moves])
+                ChessEngine.perform_move("g1f3", actualBoard)
+                self.assertIsNone(book.choose_move(actualBoard))
+            finally:
+                book.close()
+
+    def test_opening_book_2(self):
+        # The binary search finds every key of a larger book, the game plays the book move without searching
+        random_generator = random.Random(24)
+        entries = [(random_generator.getrandbits(64), random_generator.getrandbits(12), 1) for _ in range(1000)]
+        actualBoard = ChessBoard()
+        entries.append((actualBoard.hash_key, MoveEncoding.from_algebraic(actualBoard, "b1a3"), 5))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "book.bin")
+            OpeningBook.build(path, entries)
+            book = OpeningBook(path)
+            try:
+                for key, encoded_move, _ in entries[::50]:
+                    index = book._find_first(key)
+                    self.assertEqual((key, encoded_move), OpeningBook.RECORD.unpack_from(book._mmap, index * OpeningBook.RECORD.size)[:2])
+            finally:
+                book.close()
+            actualGame = ChessGame(actualBoard, isBlackAI=True, isWhiteAI=True, opening_book=path)
+            try:
+                actualGame.process_next_move(3, print_board=False)
+            finally:
+                actualGame.close()
+        expectedBoard = ChessBoard()
+        expectedBoard.load_from_fen("rnbqkbnr/pppppppp/8/8/8/N7/PPPPPPPP/R1BQKBNR b KQkq - 0 1")
+        self.assertEqualBitboards(expectedBoard, actualBoard)
+
+    def test_endgame_tablebase_1(self):
+        # A king next to the hill wins with the next move, with the opponent to move it wins a move later. A generation
+        # that finds a chunk already on disk continues with it and writes the same table.
+        with tempfile.TemporaryDirectory() as directory:
+            path = EndgameTablebase.generate(directory, "KvK", processes=1)
+            with open(path, "rb") as table_file:
+                expectedTable = table_file.read()
+            os.remove(path)
+            chunk_directory = path + ".chunks"
+            os.makedirs(chunk_directory)
+            with open(EndgameTablebase._get_chunk_path(chunk_directory, 0), "wb") as chunk_file:
+                chunk_file.write(b"".join(EndgameTablebase._classify(EndgameTablebase(directory), EndgameTablebase._parse_signature("KvK"), 0, 8192)))
+            EndgameTablebase.generate(directory, "KvK", processes=1)
+            with open(path, "rb") as table_file:
+                self.assertEqual(expectedTable, table_file.read())
+            self.assertFalse(os.path.exists(chunk_directory))
+
+            # Only tables of up to MAX_PIECES pieces are generated
+            self.assertRaises(ValueError, EndgameTablebase.generate, directory, "KQRvKR", 1)
+            self.assertRaises(ValueError, EndgameTablebase.generate, directory, "KQvQ", 1)
+            self.assertEqual(["KvK.tb"], os.listdir(directory))
+
+            tablebase = EndgameTablebase(directory)
+            try:
+                actualBoard = ChessBoard()
+                for fen, expected_entry in [("k7/8/8/8/8/4K3/8/8 w - - 0 1", (constants.WHITE, 1)),
+                                            ("k7/8/8/8/8/4K3/8/8 b - - 0 1", (constants.WHITE, 2)),
+                                            ("k7/8/8/8/3K4/8/8/8 b - - 0 1", (constants.WHITE, 0)),
+                                            ("8/8/8/8/8/8/8/K6k w - - 0 1", (constants.WHITE, 5)),
+                                            ("k7/8/8/8/3K4/8/8/8 w - - 0 1", None),
+                                            ("k7/8/8/8/8/4K3/8/7Q w - - 0 1", None)]:
+                    actualBoard.load_from_fen(fen)
+                    self.assertEqual(expected_entry, tablebase.probe(actualBoard))
+            finally:
+                tablebase.close()
+
+    def test_endgame_tablebase_2(self):
+        # Every position of a table agrees with the best of its moves, and the search keeps the fastest win
+        with tempfile.TemporaryDirectory() as directory:
+            path = EndgameTablebase.generate(directory, "KvK", processes=1)
+            with open(path, "rb") as table_file:
+                table = table_file.read()
+            tablebase = EndgameTablebase(directory)
+            actualBoard = ChessBoard()
+            actualBoard.tablebase = tablebase
+            try:
+                pieces = EndgameTablebase._parse_signature("KvK")
+                for index in range(0, len(table), 7):
+                    if table[index] == EndgameTablebase.INVALID:
+                        continue
+                    EndgameTablebase._load_position(actualBoard, pieces, index)
+                    actualBoard.move_stack = []
+                    status = PositionStatus(actualBoard)
+                    if status.result is not None:
+                        self.assertEqual(1, table[index])
+                        continue
+                    child_distances = []
+                    for move in status.legal_moves:
+                        actualBoard.make_move(move)
+                        winner, distance = tablebase.probe(actualBoard)
+                        actualBoard.unmake_move()
+                        child_distances.append((winner == actualBoard.current_player, -distance if winner == actualBoard.current_player else distance))
+                    self.assertEqual(abs(max(child_distances)[1]) + 2, table[index])
+
+                actualBoard.load_from_fen("8/8/8/8/8/8/8/K6k w - - 0 1")
+                move, _, _ = actualBoard.iterative_depth_search(2)
+                actualBoard.make_move(move)
+                self.assertEqual((constants.WHITE, 4), tablebase.probe(actualBoard))
+
+                # The third repetition is a draw, although the table has a win for white
+                actualBoard.load_from_fen("8/8/8/8/8/8/8/K6k w - - 0 1")
+                for _ in range(3):
+                    for algebraic_move in ["a1b1", "h1g1", "b1a1", "g1h1"]:
+                        actualBoard.make_move(ChessEngine.algebraic_move_to_binary(algebraic_move))
+                self.assertEqual((constants.WHITE, 5), tablebase.probe(actualBoard))
+                score, _, _ = actualBoard.negamax(-math.inf, math.inf, 2, 0, ply=1)
+                self.assertEqual(actualBoard.evaluate_board(status=PositionStatus(actualBoard)), score)
+                actualBoard.load_from_fen("8/8/8/8/8/8/8/K6k w - - 0 1")
+                score, _, _ = actualBoard.negamax(-math.inf, math.inf, 2, 0, ply=1)
+                self.assertEqual(EndgameTablebase.WIN_SCORE - 5, score)
+            finally:
+                tablebase.close()
+
+    def test_parallel_search_1(self):
+        # The root-split search finds the same move as the serial search
+        parallel_search = ParallelSearch(2, tt_size_mb=1)
+        try:
+            for fen in ["r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1",
+                        "r2qr1k1/p4ppp/2Q1b3/4N3/5B2/3BnP2/PP4PP/R4RK1 w - - 0 19"]:
+                actualBoard = ChessBoard()
+                actualBoard.load_from_fen(fen)
+                serial_move, _, _ = actualBoard.iterative_depth_search(3)
+                parallel_move, _, principal_variation = actualBoard.iterative_depth_search(3, parallel_search=parallel_search)
+                self.assertEqual(serial_move, parallel_move)
+                self.assertEqual(parallel_move, principal_variation[0])
+                self.assertEqual([], actualBoard.move_stack)
+        finally:
+            parallel_search.close()
+
+    def test_shared_transposition_table_1(self):
+        # Entries written through one attachment are found through another one, torn entries are ignored
+        table = SharedTranspositionTable(1)
+        other_table = SharedTranspositionTable(1, table.name)
+        try:
+            key = 0x123456789ABCDEF
+            move = MoveEncoding.from_algebraic(Position(), "e2e4")
+            table.store(key, 4, -1.5, TranspositionTable.LOWER_BOUND, move)
+            self.assertEqual((4, -1.5, TranspositionTable.LOWER_BOUND, move), other_table.probe(key))
+            self.assertIsNone(other_table.probe(key + 1))
+            # Data word of another entry, as left behind by two processes writing at the same time
+            slot = (key & (table.bucket_count - 1)) * TranspositionTable.BUCKET_SIZE * 3
+            table._words[slot + 1] ^= 1 << TranspositionTable._DEPTH_SHIFT
+            self.assertIsNone(other_table.probe(key))
+        finally:
+            other_table.close()
+            table.close()
+            table.unlink()
+
+    def test_shared_transposition_table_2(self):
+        # Another process writes the same slot between the score and the check word of this one: the entry left
+        # behind has this key and data but the other score and is not found
+        table = SharedTranspositionTable(1)
+        other_table = SharedTranspositionTable(1, table.name)
+        key = 0x123456789ABCDEF
+        slot = (key & (table.bucket_count - 1)) * TranspositionTable.BUCKET_SIZE * 3
+        scores = table._scores
+
+        class InterruptedScores:
+            def __setitem__(self, index, score):
+                scores[index] = score
+                other_table._write_slot(slot, key + 1, 1 << TranspositionTable._DEPTH_SHIFT, 7.25)
+
+        try:
+            table._scores = InterruptedScores()
+            table.store(key, 4, -1.5, TranspositionTable.EXACT, MoveEncoding.from_algebraic(Position(), "e2e4"))
+            table._scores = scores
+            self.assertEqual(7.25, scores[slot + 2])
+            self.assertIsNone(other_table.probe(key))
+            self.assertIsNone(other_table.probe(key + 1))
+        finally:
+            table._scores = scores
+            other_table.close()
+            table.close()
+            table.unlink()
+
+    def test_lazy_smp_1(self):
+        search = LazySmpSearch(2, tt_size_mb=1)
+        try:
+            actualBoard = ChessBoard()
+            actualBoard.load_from_fen("r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1")
+            move, counter, principal_variation = search.search(actualBoard, 3)
+            self.assertIn(move, ChessEngine.generate_legal_moves(actualBoard))
+            self.assertEqual(move, principal_variation[0])
+            self.assertGreater(counter, 0)
+        finally:
+            search.close()
+
+    def test_batch_evaluator_1(self):
+        # The vectorised evaluation agrees with the scalar one on the positions of random games
+        random_generator = random.Random(18)
+        bitboards = []
+        players = []
+        expected_scores = []
+        for _ in range(5):
+            actualBoard = ChessBoard()
+            for _ in range(40):
+                legal_moves = ChessEngine.generate_legal_moves(actualBoard)
+                if not legal_moves:
+                    break
+                actualBoard.make_move(random_generator.choice(legal_moves))
+                bitboards.append(list(actualBoard.bitboards))
+                players.append(actualBoard.current_player)
+                expected_scores.append(actualBoard.evaluate_board(with_king_safety=False)
+                                       + actualBoard._evaluate_king_proximity(actualBoard.current_player))
+        scores = BatchEvaluator.evaluate(list(zip(*bitboards)), players)
+        for expected_score, score in zip(expected_scores, scores.tolist()):
+            self.assertAlmostEqual(expected_score, score, places=9)
+        white, black, kings = zip(*[(boards[constants.WHITE], boards[constants.BLACK], boards[constants.KING]) for boards in bitboards])
+        proximity_scores = BatchEvaluator.king_proximity(white, black, kings, players)
+        for index in range(0, len(bitboards), 17):
+            actualBoard.bitboards = bitboards[index]
+            self.assertAlmostEqual(actualBoard._evaluate_king_proximity(players[index]), proximity_scores[index], places=9)
+
+    def test_batch_evaluator_2(self):
+        # The search with batch evaluated leaves finds the same move
+        for fen in ["r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1",
+                    "rnbqkbnr/p1pppppp/8/1p6/Q7/2P5/PP1PPPPP/RNB1KBNR w KQkq - 0 1"]:
+            actualBoard = ChessBoard()
+            actualBoard.load_from_fen(fen)
+            move, _, _ = actualBoard.iterative_depth_search(3)
+            expectedBoard = ChessBoard()
+            expectedBoard.load_from_fen(fen)
+            batch_move, _, _ = expectedBoard.iterative_depth_search(3, batch_evaluation=True)
+            self.assertEqual(move, batch_move)
+            self.assertGreater(len(expectedBoard.king_proximity_cache), 0)
+            self.assertFalse(expectedBoard.use_batch_evaluation)
+
+    def test_perft_1(self):
+        # Expected node counts of the reference positions up to depth 3
+        self.assertTrue(Perft.run_suite(3, print_results=False))
+
+    def test_perft_2(self):
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w - - 0 1")
+        hash_key = actualBoard.hash_key
+        counts = Perft.divide(actualBoard, 2)
+        self.assertEqual(46, len(counts))
+        self.assertEqual(1906, sum(counts.values()))
+        self.assertEqual(counts, Perft.divide(actualBoard, 2, processes=2))
+        self.assertEqual(hash_key, actualBoard.hash_key)
+
+    def test_position_analyser_1(self):
+        # Results come back in input order, a repeated position is searched once and an invalid line gives an error
+        fens = [
+            "r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1",
+            "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+            "not a position",
+            "r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 5 9 bm c8g4;",
+        ]
+        analyser = PositionAnalyser(2, tt_size_mb=1)
+        try:
+            results = list(analyser.analyse_many(fens, {"depth": 3}))
+        finally:
+            analyser.close()
+        self.assertEqual(fens, [result["fen"] for result in results])
+        self.assertIn("error", results[2])
+        for result in results[:2] + results[3:]:
+            self.assertEqual(3, result["depth"])
+            self.assertEqual(result["best_move"], result["pv"][0])
+            self.assertGreater(result["nodes"], 0)
+        self.assertEqual({key: value for key, value in results[0].items() if key != "fen"},
+                         {key: value for key, value in results[3].items() if key != "fen"})
+
+    def test_position_analyser_2(self):
+        # The analysis of a position gives the same move and score as a search on a new board
+        fen = "r1bqk1nr/8/2n3P1/p1bP3p/3pPPQ1/p1N5/8/R1B1KBNR b KQkq - 0 1"
+        actualBoard = ChessBoard()
+        actualBoard.load_from_fen(fen)
+        search_controller = SearchController()
+        move, _, _ = actualBoard.iterative_depth_search(3, transposition_table=TranspositionTable(1), search_controller=search_controller)
+        analyser = PositionAnalyser(1, tt_size_mb=1)
+        try:
+            result, = analyser.analyse_many([fen], {"depth": 3})
+        finally:
+            analyser.close()
+        self.assertEqual(ChessEngine.binary_move_to_algebraic(move[0], move[1]), result["best_move"])
+        self.assertEqual(search_controller.best_score, result["score"])
+
 
 
     # def test_en_passant(self):